@@ -1,6 +1,7 @@
 """Discord LLM Bot - Main module"""
 
 import asyncio
+import io
 import json
 import logging
 import re
@@ -8,8 +9,9 @@ import os
 import random
 import sys
 import time
-import traceback
-from typing import Dict, List
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Set, Tuple
 
 logger = logging.getLogger("Bot")
 
@@ -21,15 +23,21 @@ from PIL import Image
 
 from commands import CommandHandlers
 from config import (
+    CLAUDE_USE_PTY,
     CONTEXT_LIMIT,
+    CONTEXT_RECENT_WITH_SUMMARY,
+    CONTEXT_SUMMARY_BATCH,
+    CONTEXT_SINK_SIZE,
     DISCORD_BOT_TOKEN,
     FILE_INPUT_FOLDER,
     GUILD_ID,
     IMAGE_RECOGNITION_MODEL,
     CHAT_MODEL,
+    MAX_CONCURRENT_QUERIES,
     MAX_DISCORD_MESSAGE_LENGTH,
     OUTPUT_DIR_T2I,
     VISION_MODEL_CTX,
+    setup_logging,
 )
 from image_generation import (
     ImageGenerator,
@@ -43,15 +51,19 @@ from claude_client import ClaudeClient
 from claude_code_client import ClaudeCodeClient, RateLimitError
 from claude_code_client_pty import ClaudeCodeClientPTY
 from models import is_claude_code_model, is_anthropic_model
-from utils import encode_images_to_base64
+from utils import IMAGE_EXTENSIONS, encode_images_to_base64, encode_images_to_base64_async
 from rag_system import RAGSystem
 from web_extractor import extract_webpage_context, web_search, format_search_results, js_renderer
 from file_parser import FileParser
 from mention_extractor import extract_mention_context
-from response_splitter import split_response_by_markers, split_response_by_paragraphs, split_long_message, calculate_typing_delay
+from response_splitter import (
+    split_response_by_markers, split_response_by_paragraphs, split_long_message,
+    calculate_typing_delay, strip_think_tags, MESSAGE_SPLIT_MARKER,
+)
 from sandbox import safe_path, SandboxViolation
 from plugin_base import HookType
 import chat_history
+import context_store
 from plugin_manager import PluginManager
 
 # charlie was here
@@ -65,6 +77,18 @@ _IMAGE_GEN_KEYWORDS = re.compile(
     re.IGNORECASE
 )
 
+# Raw Discord user mentions (<@123> / <@!123>)
+_USER_MENTION_RE = re.compile(r'<@!?\d+>')
+
+# Short reactions that are never an image edit request. Follow-ups to a bot
+# image (or a message with an attachment) otherwise go to the LLM classifier
+# on every turn, so "thanks"/"lol" would each cost a round-trip.
+_SMALLTALK_RE = re.compile(
+    r'^\W*(thanks?( you)?|thx|ty|lol|lmao|haha+|nice|cool|ok(ay)?|wow|great|awesome|perfect'
+    r'|love (it|this)|amazing|beautiful)\W*$',
+    re.IGNORECASE
+)
+
 # Keywords that suggest the user needs up-to-date / web-searchable info
 _SEARCH_KEYWORDS = re.compile(
     r'\b(latest|recent|current|when|happening|happened|recently|today|yesterday|tonight|this week|this month|this year'
@@ -74,6 +98,18 @@ _SEARCH_KEYWORDS = re.compile(
     re.IGNORECASE
 )
 
+# "<attachment id>_" prefix on saved attachment files (see on_message)
+_ATTACHMENT_ID_PREFIX_RE = re.compile(r'^\d+_')
+
+# Bare URLs (not already wrapped in <>), wrapped to suppress Discord auto-embeds
+_BARE_URL_RE = re.compile(r'(?<![<])(https?://\S+)')
+
+# Fields of the "[Generated an image ...]" context entry, for follow-up edits
+_PREV_IMAGE_PROMPT_RE = re.compile(r'\[Generated an image with the following prompt: (.+?)\]', re.DOTALL)
+_PREV_IMAGE_SEED_RE = re.compile(r'seed: (\d+)')
+_PREV_IMAGE_SIZE_RE = re.compile(r'size: (\d+)x(\d+)')
+_PREV_IMAGE_PATH_RE = re.compile(r'path: (.+?)\)')
+
 # Keywords that suggest the user wants the bot to modify its own code
 _EDIT_CODE_TAG = re.compile(
     r'\[EDIT_CODE\](.*?)\[/EDIT_CODE\]',
@@ -81,6 +117,38 @@ _EDIT_CODE_TAG = re.compile(
 )
 
 
+def _read_bytes(path: str) -> bytes:
+    """Read a whole file (run via asyncio.to_thread)."""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _as_files(paths: List[str], contents: List[bytes]) -> List[discord.File]:
+    """Wrap already-read file contents as uploads named after their paths."""
+    return [
+        discord.File(io.BytesIO(data), filename=os.path.basename(path))
+        for path, data in zip(paths, contents)
+    ]
+
+
+@dataclass
+class RequestState:
+    """State for one incoming message, threaded from on_message through
+    query_ollama to _send_response.
+
+    Kept per request rather than on the bot instance, since channels are
+    handled concurrently and would overwrite each other's state.
+    """
+    sources: List[dict] = field(default_factory=list)  # URL-fetched + web search, for the footnote
+    raw_response: str | None = None  # Unprocessed LLM output, set by query_ollama
+    # Early delivery of ---MSG--- parts while the response is still streaming
+    streamed_upto: int = 0  # Offset in the raw response already handed to delivery
+    scanned_upto: int = 0  # Offset already searched for a ---MSG--- marker
+    streamed_parts: int = 0
+    stream_stopped: bool = False
+    deliveries: List[asyncio.Future] = field(default_factory=list)
+
+
 class OllamaBot(discord.Client):
     """Main Discord bot class"""
 
@@ -88,22 +156,41 @@ class OllamaBot(discord.Client):
         super().__init__(intents=discord.Intents.all())
         self.tree = app_commands.CommandTree(self)
 
-        # Per-server per-channel context
-        self.context: Dict[str, Dict[str, List[dict]]] = {}
+        # Per-server per-channel context. Each channel's history is a bounded
+        # deque so appending past CONTEXT_LIMIT evicts the oldest turn in O(1).
+        # Restored from context.db so conversations survive restarts.
+        self.context: Dict[int, Dict[int, Deque[dict]]] = context_store.load_all()
+        # Rolling LLM summary of messages that scrolled out of each window,
+        # plus the evicted messages waiting to be folded into it
+        self._channel_summaries: Dict[Tuple[int, int], str] = context_store.load_summaries()
+        self._pending_evicted: Dict[Tuple[int, int], List[dict]] = defaultdict(list)
+        self._summarizing: Set[Tuple[int, int]] = set()
+        # Bumped by clear_context so an in-flight summary of a cleared
+        # conversation is discarded instead of written back
+        self._clear_generation: Dict[Tuple[int, int], int] = defaultdict(int)
+        # Whether each channel's newest context entry carries images (pick_model)
+        self._last_has_image: Dict[Tuple[int, int], bool] = {}
+        self._self_mention_re = None  # see _self_mention_pattern
 
         # Initialize clients
         self.ollama_client = OllamaClient()
         self.claude_client = ClaudeClient()
         # Use PTY client (persistent tmux session) if enabled, otherwise one-shot CLI
-        use_pty = os.getenv("CLAUDE_USE_PTY", "").lower() in ("1", "true", "yes")
-        if use_pty:
+        if CLAUDE_USE_PTY:
             self.claude_code_client = ClaudeCodeClientPTY(session_name="claude_bot")
             print("[bot] Using Claude Code PTY client (tmux session)")
         else:
             self.claude_code_client = ClaudeCodeClient()
             print("[bot] Using Claude Code CLI client (one-shot)")
         self.image_gen = ImageGenerator()
-        self._last_search_sources: List[dict] = []
+
+        # Serialize responses per channel; cap concurrent LLM queries globally
+        self._channel_locks: Dict[int, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._query_semaphore = asyncio.Semaphore(MAX_CONCURRENT_QUERIES)
+        # Paced reply delivery runs on a per-channel queue so the channel lock
+        # can be released (and the next query started) while typing delays play out
+        self._send_queues: Dict[int, asyncio.Queue] = {}
+        self._send_workers: Dict[int, asyncio.Task] = {}
 
         # Active model (switchable via /set_model, persisted to disk)
         self._state_file = os.path.join(os.path.dirname(__file__), "bot_state.json")
@@ -193,11 +280,18 @@ class OllamaBot(discord.Client):
             return {}
 
     def _save_state(self):
-        """Persist bot state to disk."""
+        """Persist bot state to disk.
+
+        Written to a temp file and swapped in with os.replace, so a crash
+        mid-write (the case crash reporting cares about) never leaves a
+        truncated state file behind.
+        """
         self._state["active_model"] = self.active_model
+        tmp_path = f"{self._state_file}.tmp"
         try:
-            with open(self._state_file, "w") as f:
-                json.dump(self._state, f)
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps(self._state).encode("utf-8"))
+            os.replace(tmp_path, self._state_file)
         except OSError as e:
             print(f"Warning: could not save state: {e}")
 
@@ -358,22 +452,139 @@ class OllamaBot(discord.Client):
             except Exception as e:
                 print(f"Error handling crash sentinel: {e}")
 
+    def _enqueue_delivery(self, channel: int, coro) -> asyncio.Future:
+        """Queue a send coroutine behind the channel's earlier replies.
+
+        Returns a future resolved with the coroutine's result once it has run.
+        """
+        queue = self._send_queues.get(channel)
+        if queue is None:
+            queue = self._send_queues[channel] = asyncio.Queue()
+        worker = self._send_workers.get(channel)
+        if worker is None or worker.done():
+            # Also restarts a worker that died, so the channel's queue drains
+            self._send_workers[channel] = asyncio.create_task(self._send_worker(channel, queue))
+        done = asyncio.get_running_loop().create_future()
+        queue.put_nowait((coro, done))
+        return done
+
+    async def _send_worker(self, channel: int, queue: asyncio.Queue):
+        """Deliver queued replies for one channel, strictly in order."""
+        while True:
+            coro, done = await queue.get()
+            try:
+                result = await coro
+                # The awaiting caller may have been cancelled meanwhile
+                if not done.done():
+                    done.set_result(result)
+            except Exception as e:
+                logger.exception("delivery failed for channel %s", channel)
+                if not done.done():
+                    done.set_exception(e)
+            finally:
+                queue.task_done()
+
+    def get_channel_context(self, server: int, channel: int) -> Deque[dict]:
+        """Return the context window for a channel, creating it if needed."""
+        channels = self.context.setdefault(server, {})
+        ctx = channels.get(channel)
+        if ctx is None:
+            ctx = channels[channel] = deque(maxlen=CONTEXT_LIMIT)
+        return ctx
+
+    def _window_limit(self, key: Tuple[int, int]) -> int:
+        """Verbatim entries a channel keeps: the full CONTEXT_LIMIT until it
+        has a summary, then the anchors plus CONTEXT_RECENT_WITH_SUMMARY."""
+        if key in self._channel_summaries:
+            return min(CONTEXT_LIMIT, CONTEXT_SINK_SIZE + CONTEXT_RECENT_WITH_SUMMARY)
+        return CONTEXT_LIMIT
+
+    async def append_context(self, server: int, channel: int, entry: dict):
+        """Append an entry to a channel's context and persist it.
+
+        When the window is full, the oldest entry after the first
+        CONTEXT_SINK_SIZE (which anchor the conversation and are kept) is
+        evicted and queued for the channel's rolling summary instead of
+        being dropped outright. Once a summary exists the window shrinks
+        (see _window_limit), so the summary replaces older turns in the
+        prompt rather than adding to them.
+        """
+        ctx = self.get_channel_context(server, channel)
+        key = (server, channel)
+        limit = self._window_limit(key)
+        sink = min(CONTEXT_SINK_SIZE, limit - 1)
+        while len(ctx) >= limit:
+            self._pending_evicted[key].append(ctx[sink])
+            del ctx[sink]
+        ctx.append(entry)
+        self._last_has_image[key] = bool(entry.get("images"))
+        await context_store.append(server, channel, entry, keep=limit)
+
+        if len(self._pending_evicted[key]) >= CONTEXT_SUMMARY_BATCH and key not in self._summarizing:
+            self._summarizing.add(key)
+            asyncio.create_task(self._update_channel_summary(key))
+
+    async def clear_context(self, server: int, channel: int):
+        """Forget a channel's context window, summary and pending evictions."""
+        key = (server, channel)
+        channels = self.context.get(server)
+        if channels is not None and channel in channels:
+            channels[channel].clear()
+        self._clear_generation[key] += 1
+        self._channel_summaries.pop(key, None)
+        self._pending_evicted.pop(key, None)
+        self._last_has_image.pop(key, None)
+        await context_store.clear_channel(server, channel)
+
+    async def _update_channel_summary(self, key: Tuple[int, int]):
+        """Fold queued evicted messages into the channel's rolling summary.
+
+        Runs in the background so the reply isn't held up. The summary only
+        changes once every CONTEXT_SUMMARY_BATCH evictions, so the prompt
+        prefix it sits in stays stable between updates.
+        """
+        generation = self._clear_generation[key]
+        evicted: List[dict] = []
+        updated = False
+        try:
+            evicted = self._pending_evicted.pop(key, [])
+            if not evicted:
+                return
+            lines = []
+            for msg in evicted:
+                speaker = msg.get("name", "User") if msg["role"] == "user" else "Assistant"
+                lines.append(f"{speaker}: {msg['content'][:1000]}")
+            summary = await self.ollama_client.summarize_conversation(
+                self._channel_summaries.get(key, ""), "\n".join(lines)
+            )
+            if self._clear_generation[key] != generation:
+                logger.info("discarding summary for %s/%s: cleared meanwhile", key[0], key[1])
+                return
+            if summary:
+                self._channel_summaries[key] = summary
+                updated = True
+                await context_store.save_summary(key[0], key[1], summary)
+                logger.info("updated summary for %s/%s (%d chars)", key[0], key[1], len(summary))
+        except Exception as e:
+            logger.warning("channel summary update failed for %s/%s: %s", key[0], key[1], e)
+        finally:
+            self._summarizing.discard(key)
+            if evicted and not updated and self._clear_generation[key] == generation:
+                # These turns already left the window; put them back (ahead of
+                # anything evicted meanwhile) so the next update folds them in
+                self._pending_evicted[key] = evicted + self._pending_evicted.get(key, [])
+            # Evictions that piled up meanwhile (the window just shrank, or
+            # a long exchange) get folded in without waiting for the next
+            # append; after a failure, retrying waits for the next eviction
+            elif len(self._pending_evicted.get(key, ())) >= CONTEXT_SUMMARY_BATCH:
+                self._summarizing.add(key)
+                asyncio.create_task(self._update_channel_summary(key))
+
     def pick_model(self, server: int, channel: int) -> str:
         """Pick the appropriate model based on context and active backend"""
-        # Claude Code doesn't support images via CLI
-        if is_claude_code_model(self.active_model):
-            has_images = (server in self.context and
-                channel in self.context[server] and
-                self.context[server][channel] and
-                self.context[server][channel][-1].get("images"))
-            if has_images:
-                return IMAGE_RECOGNITION_MODEL
-            return self.active_model
-        # Local models: switch to vision model when images are present
-        if (server in self.context and
-            channel in self.context[server] and
-            self.context[server][channel] and
-            self.context[server][channel][-1].get("images")):
+        # Switch to the vision model when the latest entry carries images
+        # (Claude Code doesn't support images via CLI either)
+        if self._last_has_image.get((server, channel)):
             return IMAGE_RECOGNITION_MODEL
         return self.active_model
 
@@ -403,31 +614,20 @@ class OllamaBot(discord.Client):
         if message.content.strip() and await self.plugin_manager.dispatch_message_handlers(message):
             return
 
-        # Handle attachments
-        image_files = []
-        document_files = []
-
-        for attachment in message.attachments:
-            safe_filename = os.path.basename(attachment.filename)
-            file_path = safe_path(os.path.join(FILE_INPUT_FOLDER, safe_filename))
-            await attachment.save(file_path)
-
-            ext = os.path.splitext(file_path)[1].lower()
-            if ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp']:
-                image_files.append(file_path)
-            else:
-                document_files.append(file_path)
-
         # Determine response mode
         is_direct_mention = self.user in message.mentions
         is_reply_to_bot = False
 
         if message.reference:
-            # Use cached resolved message when available
-            ref_msg = message.reference.resolved
-            if ref_msg is None:
+            # Prefer the client's message cache or the message Discord resolved
+            # in the payload; only fall back to a REST fetch on a miss.
+            ref = message.reference
+            ref_msg = ref.cached_message
+            if ref_msg is None and isinstance(ref.resolved, discord.Message):
+                ref_msg = ref.resolved
+            if ref_msg is None and not isinstance(ref.resolved, discord.DeletedReferencedMessage):
                 try:
-                    ref_msg = await message.channel.fetch_message(message.reference.message_id)
+                    ref_msg = await message.channel.fetch_message(ref.message_id)
                 except discord.NotFound:
                     ref_msg = None
             if ref_msg and ref_msg.author.id == self.user.id:
@@ -437,76 +637,134 @@ class OllamaBot(discord.Client):
         if not (is_direct_mention or is_reply_to_bot):
             return
 
-        # Track last active channel for crash reporting
-        self._state["last_active_channel_id"] = channel
-        self._save_state()
+        # Handle attachments — download them all concurrently (only once we
+        # know we're replying; nothing else reads them)
+        image_files = []
+        document_files = []
 
-        try:
-            user_text = re.sub(r'<@!?\d+>', '', message.content).strip()
-
-            # If replying to a message, inject the referenced message into context
-            if message.reference and ref_msg and ref_msg.author.id != self.user.id:
-                if server not in self.context:
-                    self.context[server] = {}
-                if channel not in self.context[server]:
-                    self.context[server][channel] = []
-                ctx = self.context[server][channel]
-                ref_content = ref_msg.clean_content
-
-                # Download and encode any attachments from the referenced message
-                ref_images = []
-                ref_doc_context = ""
-                for att in ref_msg.attachments:
-                    safe_filename = os.path.basename(att.filename)
-                    file_path = safe_path(os.path.join(FILE_INPUT_FOLDER, f"ref_{safe_filename}"))
-                    try:
-                        await att.save(file_path)
-                        ext = os.path.splitext(file_path)[1].lower()
-                        if ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp']:
-                            ref_images.extend(encode_images_to_base64([file_path]))
-                        else:
-                            content = FileParser.parse_file(file_path)
-                            if content:
-                                ref_doc_context += f"\n\n--- Content of {att.filename} ---\n{content}\n--------------------------\n"
-                    except Exception as e:
-                        print(f"Error processing ref attachment {att.filename}: {e}")
-                    finally:
-                        try:
-                            os.remove(file_path)
-                        except OSError:
-                            pass
-
-                if ref_doc_context:
-                    ref_content += f"\n\n[Attached Documents Context]{ref_doc_context}"
-
-                # Only add if not already the last entry in context
-                already_in_ctx = (
-                    ctx and ctx[-1]["role"] == "user"
-                    and ctx[-1]["content"] == ref_content
-                )
-                if not already_in_ctx and (ref_content or ref_images):
-                    ctx.append({
-                        "role": "user",
-                        "name": ref_msg.author.display_name,
-                        "content": ref_content or "(attachment)",
-                        "timestamp": ref_msg.created_at.timestamp(),
-                        "images": ref_images,
-                    })
-                    if len(ctx) > CONTEXT_LIMIT:
-                        ctx.pop(0)
+        # Prefixed with the attachment ID: pasted images are all "image.png",
+        # and attachments of one message (or concurrent messages in other
+        # channels) must not save over / delete each other's files
+        attachment_paths = [
+            safe_path(os.path.join(
+                FILE_INPUT_FOLDER, f"{attachment.id}_{os.path.basename(attachment.filename)}"
+            ))
+            for attachment in message.attachments
+        ]
+        await asyncio.gather(*(
+            attachment.save(file_path)
+            for attachment, file_path in zip(message.attachments, attachment_paths)
+        ))
+
+        for file_path in attachment_paths:
+            ext = os.path.splitext(file_path)[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                image_files.append(file_path)
+            else:
+                document_files.append(file_path)
 
-            fetched_sources = await self.build_context(message, server, False, image_files, document_files)
-            # logger.info(f"[MSG-DEBUG] Calling _send_response: msg_id={message.id} channel={channel}")
-            await self._send_response(message, server, channel, fetched_sources)
+        # Track last active channel for crash reporting. Only rewrite the
+        # state file when the channel actually changes — most messages come
+        # from the same channel, so this avoids a disk write per reply.
+        if self._state.get("last_active_channel_id") != channel:
+            self._state["last_active_channel_id"] = channel
+            self._save_state()
+
+        try:
+            # One response at a time per channel so concurrent messages can't
+            # interleave their context appends or reply out of order.
+            async with self._channel_locks[channel]:
+                # If replying to a message, inject the referenced message into context
+                if message.reference and ref_msg and ref_msg.author.id != self.user.id:
+                    ctx = self.get_channel_context(server, channel)
+                    ref_content = ref_msg.clean_content
+
+                    # Download and encode any attachments from the referenced message
+                    ref_images = []
+                    ref_doc_parts = []
+                    for images, doc in await asyncio.gather(*(
+                        self._load_ref_attachment(att) for att in ref_msg.attachments
+                    )):
+                        ref_images.extend(images)
+                        if doc:
+                            ref_doc_parts.append(doc)
+                    ref_doc_context = "".join(ref_doc_parts)
+
+                    if ref_doc_context:
+                        ref_content += f"\n\n[Attached Documents Context]{ref_doc_context}"
+
+                    # Only add if not already the last entry in context
+                    already_in_ctx = (
+                        ctx and ctx[-1]["role"] == "user"
+                        and ctx[-1]["content"] == ref_content
+                    )
+                    if not already_in_ctx and (ref_content or ref_images):
+                        await self.append_context(server, channel, {
+                            "role": "user",
+                            "name": ref_msg.author.display_name,
+                            "content": ref_content or "(attachment)",
+                            "timestamp": ref_msg.created_at.timestamp(),
+                            "images": ref_images,
+                        })
+
+                fetched_sources = await self.build_context(message, server, False, image_files, document_files)
+                state = RequestState(sources=list(fetched_sources))
+                # logger.info(f"[MSG-DEBUG] Calling _send_response: msg_id={message.id} channel={channel}")
+                edit_instruction, delivered = await self._send_response(message, server, channel, state)
+
+            # The reply is sent by the channel's delivery worker; wait for it
+            # outside the lock so the next message can start generating.
+            if delivered is not None:
+                await delivered
+
+            # If the LLM decided a code edit is needed, trigger it. This can
+            # take minutes, so it runs after the channel lock is released.
+            if edit_instruction:
+                await self._execute_code_change(message, edit_instruction)
 
         except Exception as e:
-            print(f"Error in on_message: {e}")
-            print(traceback.format_exc())
+            logger.exception("on_message failed for %s/%s", server, channel)
             try:
                 await message.channel.send(f"something broke: {e}")
             except Exception:
                 pass
 
+    async def _load_ref_attachment(self, att: discord.Attachment) -> Tuple[List[str], str]:
+        """Download one attachment of a replied-to message.
+
+        Returns (base64 images, formatted document context); the file is
+        deleted afterwards. Encoding/parsing runs on a worker thread.
+        """
+        safe_filename = os.path.basename(att.filename)
+        file_path = safe_path(os.path.join(FILE_INPUT_FOLDER, f"ref_{att.id}_{safe_filename}"))
+        try:
+            await att.save(file_path)
+            ext = os.path.splitext(file_path)[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                return await asyncio.to_thread(encode_images_to_base64, [file_path]), ""
+            content = await FileParser.parse_file_async(file_path)
+            if content:
+                return [], f"\n\n--- Content of {att.filename} ---\n{content}\n--------------------------\n"
+        except Exception as e:
+            print(f"Error processing ref attachment {att.filename}: {e}")
+        finally:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+        return [], ""
+
+    def _self_mention_pattern(self) -> re.Pattern:
+        """Regex matching the bot's own mention, raw (<@id>) or rendered (@name).
+
+        Built once; self.user is only known after login.
+        """
+        if self._self_mention_re is None:
+            self._self_mention_re = re.compile(
+                rf"<@!?{self.user.id}>|@{re.escape(self.user.name)}"
+            )
+        return self._self_mention_re
+
     async def build_context(
         self,
         message: discord.Message,
@@ -523,30 +781,28 @@ class OllamaBot(discord.Client):
 
         channel = message.channel.id
 
-        if server not in self.context:
-            self.context[server] = {}
-
-        if channel not in self.context[server]:
-            self.context[server][channel] = []
-
         prompt = (
             message.content
             if not strip_mention
-            else message.clean_content.replace(f"@{self.user.name}", "").strip()
+            else self._self_mention_pattern().sub("", message.content).strip()
         )
 
-        # Process documents and clean up files after parsing
+        # Process documents (parsed concurrently off the loop — PDF/text
+        # extraction is blocking) and clean up files after parsing
         if document_files:
-            doc_context = ""
-            for doc_path in document_files:
-                content = FileParser.parse_file(doc_path)
+            contents = await asyncio.gather(*(
+                FileParser.parse_file_async(doc_path) for doc_path in document_files
+            ))
+            doc_parts = []
+            for doc_path, content in zip(document_files, contents):
                 if content:
-                    filename = os.path.basename(doc_path)
-                    doc_context += f"\n\n--- Content of {filename} ---\n{content}\n--------------------------\n"
+                    filename = _ATTACHMENT_ID_PREFIX_RE.sub("", os.path.basename(doc_path))
+                    doc_parts.append(f"\n\n--- Content of {filename} ---\n{content}\n--------------------------\n")
                 try:
                     os.remove(doc_path)
                 except OSError:
                     pass
+            doc_context = "".join(doc_parts)
 
             if doc_context:
                 prompt += f"\n\n[Attached Documents Context]{doc_context}"
@@ -556,12 +812,15 @@ class OllamaBot(discord.Client):
         if webpage_context:
             prompt = f"{prompt}\n\n{webpage_context}"
 
-        # Encode images (keep files for potential img2img editing)
+        # Encode images (keep files for potential img2img editing). Reading
+        # and base64-encoding large images is blocking, so do it off the loop,
+        # one thread per image so multi-image uploads overlap.
         images = []
         if image_files:
-            images = encode_images_to_base64(image_files)
+            images = await encode_images_to_base64_async(image_files)
 
-        self.context[server][channel].append({
+        # append_context evicts the oldest non-anchor message on overflow
+        await self.append_context(server, channel, {
             "role": "user",
             "name": message.author.display_name,
             "discord_user_id": message.author.id,
@@ -569,12 +828,11 @@ class OllamaBot(discord.Client):
             "timestamp": time.time(),
             "images": images,
             "image_files": list(image_files),  # Keep paths for img2img editing
+            # The page text is already folded into "content"; this flag tells
+            # query_ollama the URLs were fetched so it doesn't fetch them again.
+            "urls_fetched": True,
         })
 
-        # Maintain context limit
-        if len(self.context[server][channel]) > CONTEXT_LIMIT:
-            self.context[server][channel].pop(0)
-
         return fetched_sources
 
     async def _send_response(
@@ -582,29 +840,46 @@ class OllamaBot(discord.Client):
         message: discord.Message,
         server: int,
         channel: int,
-        sources: List[dict] = None,
-    ):
+        state: RequestState,
+    ) -> Tuple[str | None, asyncio.Future | None]:
         """
-        Generate and send response with natural typing delays for multiple messages.
+        Generate a response and queue it for sending with natural typing delays.
+
+        Returns the [EDIT_CODE] instruction (if the LLM asked for a code change)
+        and a future that resolves once the reply has been delivered, so the
+        caller can wait for both after releasing the channel lock.
+
+        With local models, each ---MSG--- part is queued for delivery as soon
+        as the stream has produced it, so the first message goes out while
+        the rest is still generating.
         """
+        # Check if any plugin wants to suppress text BEFORE dispatching hooks
+        # (e.g. TTS voice mode — we don't want to send text then audio)
+        suppress_text = self.plugin_manager.should_suppress_text(message)
+        logger.debug(f"[TTS-DEBUG] suppress_text={suppress_text} for user={message.author.id} "
+                     f"(voice_mode check before POST_QUERY hook)")
+
+        on_chunk = None
+        if not suppress_text and not is_anthropic_model(self.active_model):
+            async def on_chunk(text: str):
+                await self._deliver_streamed_parts(message, server, channel, state, text)
+
         async with message.channel.typing():
             start = time.perf_counter()
-            response_data = await self.query_ollama(server, channel)
+            async with self._query_semaphore:
+                response_data = await self.query_ollama(server, channel, on_chunk=on_chunk, state=state)
             end = time.perf_counter()
             elapsed = end - start
             print(f"Query took {elapsed:.2f}s")
 
-        # Merge URL-fetched sources with search sources
-        all_sources = list(sources or [])
-        search_sources = getattr(self, '_last_search_sources', [])
-        if search_sources:
-            all_sources.extend(search_sources)
-            self._last_search_sources = []
+        # URL-fetched sources plus any web search sources query_ollama added
+        all_sources = state.sources
 
         # Handle image generation responses (tuple with embed + file)
         if isinstance(response_data, tuple):
-            await message.channel.send(embed=response_data[0], file=response_data[1])
-            return
+            return None, self._enqueue_delivery(
+                channel, message.channel.send(embed=response_data[0], file=response_data[1])
+            )
 
         # Check for [EDIT_CODE] tags in the response — LLM decided a code change is needed
         # Join all text parts first since the tag may span multiple response items
@@ -612,11 +887,6 @@ class OllamaBot(discord.Client):
         full_text = "\n".join(
             item for item in response_data if isinstance(item, str)
         )
-        # Check if any plugin wants to suppress text BEFORE dispatching hooks
-        # (e.g. TTS voice mode — we don't want to send text then audio)
-        suppress_text = self.plugin_manager.should_suppress_text(message)
-        logger.debug(f"[TTS-DEBUG] suppress_text={suppress_text} for user={message.author.id} "
-                     f"(voice_mode check before POST_QUERY hook)")
 
         # Dispatch POST_QUERY hook (e.g. TTS voice mode generates + sends audio)
         logger.debug(f"[TTS-DEBUG] Dispatching POST_QUERY hook, full_text length={len(full_text)}")
@@ -632,6 +902,11 @@ class OllamaBot(discord.Client):
             edit_instruction = match.group(1).strip()
             full_text = _EDIT_CODE_TAG.sub('', full_text).strip()
 
+        # Parts already delivered during streaming: only send the remainder
+        if state.streamed_upto and state.raw_response is not None:
+            full_text = "\n".join(self.process_response(state.raw_response[state.streamed_upto:]))
+            full_text = _EDIT_CODE_TAG.sub('', full_text).strip()
+
         # Preserve any non-string items (images, etc.) and replace text with cleaned version
         non_text_items = [item for item in response_data if not isinstance(item, str)]
         response_data = [full_text] + non_text_items if full_text else non_text_items
@@ -667,41 +942,114 @@ class OllamaBot(discord.Client):
         # Send text parts with typing delays (unless a hook suppressed text, e.g. voice mode)
         logger.debug(f"[TTS-DEBUG] About to send text. suppress_text={suppress_text}, "
                      f"all_parts count={len(all_parts)}")
-        if not suppress_text:
-            for i, part in enumerate(all_parts):
-                async with message.channel.typing():
-                    delay = calculate_typing_delay(part)
-                    delay *= random.uniform(0.9, 1.3)
-                    await asyncio.sleep(delay)
-
-                print(f"Sending response part {i+1}/{len(all_parts)}: {part[:50]}...")
-                sent_msg = await message.channel.send(part)
+        if suppress_text:
+            logger.debug(f"[TTS-DEBUG] Text suppressed — skipping {len(all_parts)} text parts")
+            return edit_instruction, None
+
+        delivered = self._enqueue_delivery(
+            channel, self._deliver_parts(
+                message, server, channel, all_parts, response_data,
+                first_is_reply=state.streamed_parts == 0,
+            )
+        )
+        if state.deliveries:
+            delivered = asyncio.gather(*state.deliveries, delivered)
+        return edit_instruction, delivered
+
+    async def _deliver_streamed_parts(
+        self,
+        message: discord.Message,
+        server: int,
+        channel: int,
+        state: RequestState,
+        text: str,
+    ):
+        """Queue every ---MSG--- part the stream has completed so far."""
+        if state.stream_stopped:
+            return
+        # Only search text that arrived since the last call (backing up by a
+        # marker's length, in case one straddles the boundary)
+        start = max(state.streamed_upto, state.scanned_upto - len(MESSAGE_SPLIT_MARKER) + 1)
+        state.scanned_upto = len(text)
+        end = text.rfind(MESSAGE_SPLIT_MARKER, start)
+        if end < 0:
+            return
+        raw = text[state.streamed_upto:end]
+        # Edit tags and thinking blocks need the full response; stop early
+        # delivery and let _send_response handle the rest as usual
+        if "[EDIT_CODE]" in raw or "<think>" in raw:
+            state.stream_stopped = True
+            return
+        state.streamed_upto = end + len(MESSAGE_SPLIT_MARKER)
+
+        parts = [
+            part
+            for item in self.process_response(raw)
+            for part in split_response_by_markers(item)
+            if part
+        ]
+        if not parts:
+            return
+        state.deliveries.append(self._enqueue_delivery(
+            channel, self._deliver_parts(
+                message, server, channel, parts, [],
+                first_is_reply=state.streamed_parts == 0,
+            )
+        ))
+        state.streamed_parts += len(parts)
 
-                # Record bot response to persistent chat history
-                await chat_history.record_bot_response(
-                    guild_id=server,
-                    channel_id=channel,
-                    bot_user_id=self.user.id,
-                    bot_name=self.user.display_name,
-                    content=part,
-                    message_id=sent_msg.id,
-                    reply_to_message_id=message.id if i == 0 else None,
+    async def _deliver_parts(
+        self,
+        message: discord.Message,
+        server: int,
+        channel: int,
+        all_parts: List[str],
+        response_data: list,
+        first_is_reply: bool = True,
+    ):
+        """Send reply parts with typing delays; image items ride along with
+        the last text part so they don't cost a separate send each."""
+        image_paths = [
+            item["image"] for item in response_data
+            if isinstance(item, dict) and "image" in item
+        ]
+        # Read attachments off the loop while the typing delays run
+        image_reads = (
+            asyncio.gather(*(asyncio.to_thread(_read_bytes, path) for path in image_paths))
+            if image_paths else None
+        )
+        for i, part in enumerate(all_parts):
+            async with message.channel.typing():
+                delay = calculate_typing_delay(part)
+                delay *= random.uniform(0.9, 1.3)
+                await asyncio.sleep(delay)
+
+            print(f"Sending response part {i+1}/{len(all_parts)}: {part[:50]}...")
+            if image_reads and i == len(all_parts) - 1:
+                sent_msg = await message.channel.send(
+                    part, files=_as_files(image_paths, await image_reads)
                 )
+                image_reads = None
+            else:
+                sent_msg = await message.channel.send(part)
 
-                if i < len(all_parts) - 1:
-                    await asyncio.sleep(random.uniform(0.3, 0.8))
+            # Record bot response to persistent chat history
+            await chat_history.record_bot_response(
+                guild_id=server,
+                channel_id=channel,
+                bot_user_id=self.user.id,
+                bot_name=self.user.display_name,
+                content=part,
+                message_id=sent_msg.id,
+                reply_to_message_id=message.id if i == 0 and first_is_reply else None,
+            )
 
-            # Handle any image items
-            for response_item in response_data:
-                if isinstance(response_item, dict) and "image" in response_item:
-                    file = discord.File(response_item["image"])
-                    await message.channel.send(file=file)
-        else:
-            logger.debug(f"[TTS-DEBUG] Text suppressed — skipping {len(all_parts)} text parts")
+            if i < len(all_parts) - 1:
+                await asyncio.sleep(random.uniform(0.3, 0.8))
 
-        # If the LLM decided a code edit is needed, trigger it
-        if edit_instruction:
-            await self._execute_code_change(message, edit_instruction)
+        # Images with no text to attach to
+        if image_reads:
+            await message.channel.send(files=_as_files(image_paths, await image_reads))
 
     async def _execute_code_change(self, message: discord.Message, instruction: str):
         """Run Claude Code to modify bot source, show diff, offer apply/revert.
@@ -948,6 +1296,53 @@ class OllamaBot(discord.Client):
         label = "apply changes and restart?" if test_passed else "tests failed. apply anyway, or revert?"
         await channel.send(label, view=view)
 
+    async def _web_search_context(self, user_content: str, enabled: bool = True) -> Tuple[str, List[dict]]:
+        """Run the web search pipeline if the message needs it (heuristic + LLM).
+
+        Returns (search summary, footnote sources); empty when no search ran.
+        """
+        if not enabled:
+            return "", []
+        # Strip Discord mentions for cleaner LLM input
+        clean_query = _USER_MENTION_RE.sub('', user_content).strip()
+        if not _SEARCH_KEYWORDS.search(clean_query):
+            return "", []
+        print("  [search heuristic matched, checking with LLM...]")
+        # Classify and extract the query concurrently: the heuristic already
+        # matched, so the query is usually needed and waiting for the verdict
+        # first would put two model round-trips back to back
+        needs_search, search_query = await asyncio.gather(
+            self.ollama_client.classify_search_task(clean_query),
+            self.ollama_client.extract_search_query(clean_query),
+        )
+        if not needs_search:
+            return "", []
+        print(f"  [searching: {search_query}]")
+        search_results = await web_search(search_query, max_results=5)
+        if not search_results:
+            return "", []
+        raw_context = format_search_results(search_results)
+        print(f"  [summarizing {len(raw_context)} chars of search results...]")
+        search_summary = await self.ollama_client.summarize_search_results(clean_query, raw_context)
+        print(f"  [summary: {len(search_summary)} chars]")
+        print(f"  [summary content: {search_summary}]")
+        search_sources = [
+            {"url": r["url"], "title": r["title"] or r["url"]}
+            for r in search_results[:3]
+        ]
+        return search_summary, search_sources
+
+    async def _wiki_context(self, query: str) -> str:
+        """RAG wiki context for a query, or "" when RAG is off.
+
+        Repeat queries are served by RAGSystem's own result and
+        query-embedding caches, which are invalidated on reindex.
+        """
+        if not self.rag_enabled or not query:
+            return ""
+        # Embedding + vector search is blocking; keep it off the loop
+        return await asyncio.to_thread(self.rag_system.get_context_for_query, query)
+
     def format_prompt(self, messages: List[dict]) -> str:
         """Format messages into a prompt with clear turn boundaries."""
         parts = []
@@ -964,17 +1359,29 @@ class OllamaBot(discord.Client):
 
     def process_response(self, text: str, limit: int = MAX_DISCORD_MESSAGE_LENGTH) -> List:
         """Process response text, handling length limits"""
-        # Remove thinking tags
-        text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+        # Most replies have no thinking block or URL; a substring check is
+        # much cheaper than running the regexes over the whole response
+        text = strip_think_tags(text)
         # Wrap bare URLs in <> to suppress Discord auto-embeds
-        text = re.sub(r'(?<![<])(https?://\S+)', r'<\1>', text)
+        if "http" in text:
+            text = _BARE_URL_RE.sub(r'<\1>', text)
         # Split long text to fit Discord's message length limit
         parts = split_long_message(text.strip(), limit)
         return parts
 
-    async def query_ollama(self, server: int, channel: int, override_messages: List[dict] = None):
-        """Query Ollama for a response"""
-        messages = override_messages or self.context[server][channel]
+    async def query_ollama(self, server: int, channel: int, override_messages: List[dict] = None,
+                           on_chunk=None, state: RequestState = None):
+        """Query Ollama for a response.
+
+        Returns the reply as a list of message parts (see process_response),
+        or an (embed, file) tuple for a generated image.
+
+        on_chunk, if given, is forwarded to the local Ollama generate call so
+        the caller can show partial output while the response streams in.
+        Web search sources are added to state.sources when a state is given.
+        """
+        # Snapshot the deque as a list so the slicing below (messages[-4:]) works
+        messages = override_messages or list(self.context[server][channel])
         user_content = messages[-1]['content']
         images = messages[-1].get("images", [])
 
@@ -984,26 +1391,30 @@ class OllamaBot(discord.Client):
         #   2. Follow-up to a previously-generated bot image in context
         #   3. Fresh user-attached image (could be an edit request like
         #      "make her hair green" or just a visual question)
-        has_recent_image_gen = any(
-            msg.get("role") == "assistant" and "[Generated an image" in msg.get("content", "")
-            for msg in messages[-4:]
+        # Most recent bot image in the last few turns; found once and reused by
+        # the classifier prefix and the modification branch below
+        last_image_gen_msg = next(
+            (msg for msg in reversed(messages[-4:])
+             if msg.get("role") == "assistant" and "[Generated an image" in msg.get("content", "")),
+            None,
         )
+        has_recent_image_gen = last_image_gen_msg is not None
         keyword_match = bool(_IMAGE_GEN_KEYWORDS.search(user_content))
         has_attached_image = bool(messages[-1].get("image_files"))
         logger.info(
             "[img] detection user_content_len=%d keyword_match=%s has_recent_image_gen=%s has_attached_image=%s",
             len(user_content), keyword_match, has_recent_image_gen, has_attached_image,
         )
-        if keyword_match or has_recent_image_gen or has_attached_image:
+        clean_content = _USER_MENTION_RE.sub('', user_content)
+        if not keyword_match and _SMALLTALK_RE.match(clean_content):
+            logger.info("[img] small-talk follow-up, skipping image-gen classifier")
+        elif keyword_match or has_recent_image_gen or has_attached_image:
             # Give the classifier enough context to disambiguate chat-about-image
             # from edit-this-image. Prefix based on what triggered us.
             classify_input = user_content
             if has_recent_image_gen and not keyword_match:
-                for msg in reversed(messages[-4:]):
-                    if msg.get("role") == "assistant" and "[Generated an image" in msg.get("content", ""):
-                        classify_input = f"[Previous: {msg['content']}]\nUser: {user_content}"
-                        logger.info("[img] follow-up classify_input includes prev marker")
-                        break
+                classify_input = f"[Previous: {last_image_gen_msg['content']}]\nUser: {user_content}"
+                logger.info("[img] follow-up classify_input includes prev marker")
             elif has_attached_image and not keyword_match:
                 classify_input = f"[User attached an image]\nUser: {user_content}"
                 logger.info("[img] attached-image classify_input includes attachment marker")
@@ -1023,23 +1434,20 @@ class OllamaBot(discord.Client):
 
                 if is_modification:
                     # Extract previous prompt, seed, dims, and file path from context
-                    for msg in reversed(messages[-4:]):
-                        content = msg.get("content", "")
-                        if msg.get("role") == "assistant" and "[Generated an image" in content:
-                            prompt_match = re.search(r'\[Generated an image with the following prompt: (.+?)\]', content, re.DOTALL)
-                            seed_match = re.search(r'seed: (\d+)', content)
-                            size_match = re.search(r'size: (\d+)x(\d+)', content)
-                            path_match = re.search(r'path: (.+?)\)', content)
-                            if prompt_match:
-                                prev_prompt = prompt_match.group(1)
-                            if seed_match:
-                                prev_seed = int(seed_match.group(1))
-                            if size_match:
-                                prev_width = int(size_match.group(1))
-                                prev_height = int(size_match.group(2))
-                            if path_match:
-                                prev_image_path = path_match.group(1)
-                            break
+                    content = last_image_gen_msg.get("content", "")
+                    prompt_match = _PREV_IMAGE_PROMPT_RE.search(content)
+                    seed_match = _PREV_IMAGE_SEED_RE.search(content)
+                    size_match = _PREV_IMAGE_SIZE_RE.search(content)
+                    path_match = _PREV_IMAGE_PATH_RE.search(content)
+                    if prompt_match:
+                        prev_prompt = prompt_match.group(1)
+                    if seed_match:
+                        prev_seed = int(seed_match.group(1))
+                    if size_match:
+                        prev_width = int(size_match.group(1))
+                        prev_height = int(size_match.group(2))
+                    if path_match:
+                        prev_image_path = path_match.group(1)
                     logger.info(
                         "[img] modification=True extracted prev_seed=%s prev_width=%s prev_height=%s "
                         "prev_image_path=%s prev_prompt_len=%s",
@@ -1123,10 +1531,14 @@ class OllamaBot(discord.Client):
                     else:
                         # Case 3: Brand new generation
                         prev_seed = -1
-                        webpage_context, _ = await extract_webpage_context(user_content)
-                        if webpage_context:
-                            logger.info("[img] extracted webpage context len=%d", len(webpage_context))
-                            user_content = f"{user_content}\n\n{webpage_context}"
+                        # build_context already fetched any URLs into the
+                        # content; only one-shot override messages (/ask) need
+                        # the extraction done here.
+                        if not messages[-1].get("urls_fetched"):
+                            webpage_context, _ = await extract_webpage_context(user_content)
+                            if webpage_context:
+                                logger.info("[img] extracted webpage context len=%d", len(webpage_context))
+                                user_content = f"{user_content}\n\n{webpage_context}"
                         logger.info("[img] rewriting prompt via generate_image_prompt")
                         prompt = (await self.image_gen.generate_image_prompt(user_content)).strip()
                         if not prompt:
@@ -1156,25 +1568,26 @@ class OllamaBot(discord.Client):
                         f"image generation failed: {type(img_err).__name__}: {img_err}"
                     ]
 
+                seed, width, height = image_info.seed, image_info.width, image_info.height
+
                 # Store image generation context for follow-up continuity (include path for img2img)
                 if override_messages is None:
-                    self.context[server][channel].append({
+                    await self.append_context(server, channel, {
                         "role": "assistant",
                         "content": (
                             f"[Generated an image with the following prompt: {prompt}] "
-                            f"(seed: {image_info.seed}, "
-                            f"size: {image_info.width}x{image_info.height}, "
-                            f"path: {file_path})"
+                            f"(seed: {seed}, size: {width}x{height}, path: {file_path})"
                         ),
                         "timestamp": time.time(),
                     })
 
-                file = discord.File(fp=file_path, filename='generated.png')
+                # Read the PNG off the loop; discord.File over a path would read
+                # the multi-MB file synchronously while the upload is sent
+                image_bytes = await asyncio.to_thread(_read_bytes, file_path)
+                file = discord.File(io.BytesIO(image_bytes), filename='generated.png')
                 image_info_text = (
-                    f"steps: {image_info.steps}, "
-                    f"cfg: {image_info.cfg_scale}, "
-                    f"size: {image_info.width}x{image_info.height}, "
-                    f"seed: {image_info.seed}"
+                    f"steps: {image_info.steps}, cfg: {image_info.cfg_scale}, "
+                    f"size: {width}x{height}, seed: {seed}"
                 )
 
                 embed = discord.Embed()
@@ -1197,32 +1610,10 @@ class OllamaBot(discord.Client):
             model = CHAT_MODEL
             using_claude_code = False
 
-        # Check if the user's message needs a web search (heuristic + LLM)
-        # Skip manual search pipeline when using Claude Code — it handles search itself
-        search_summary = ""
-        search_sources = []
-        if not using_claude_code:
-            # Strip Discord mentions for cleaner LLM input
-            clean_query = re.sub(r'<@!?\d+>', '', user_content).strip()
-            if _SEARCH_KEYWORDS.search(clean_query):
-                print("  [search heuristic matched, checking with LLM...]")
-                needs_search = await self.ollama_client.classify_search_task(clean_query)
-                if needs_search:
-                    search_query = await self.ollama_client.extract_search_query(clean_query)
-                    print(f"  [searching: {search_query}]")
-                    search_results = await web_search(search_query, max_results=5)
-                    if search_results:
-                        raw_context = format_search_results(search_results)
-                        print(f"  [summarizing {len(raw_context)} chars of search results...]")
-                        search_summary = await self.ollama_client.summarize_search_results(clean_query, raw_context)
-                        print(f"  [summary: {len(search_summary)} chars]")
-                        print(f"  [summary content: {search_summary}]")
-                        search_sources = [
-                            {"url": r["url"], "title": r["title"] or r["url"]}
-                            for r in search_results[:3]
-                        ]
-
-        self._last_search_sources = search_sources
+        # Build prompt — PTY sessions keep their own history, so only send
+        # the new message + fresh context. One-shot CLI needs the full history.
+        is_pty = isinstance(self.claude_code_client, ClaudeCodeClientPTY)
+        pty_mode = is_pty and using_claude_code
 
         # Extract active user IDs from conversation context for memory filtering
         active_user_ids = list({
@@ -1230,11 +1621,31 @@ class OllamaBot(discord.Client):
             for m in messages if m.get("discord_user_id")
         })
 
-        # Build prompt — PTY sessions keep their own history, so only send
-        # the new message + fresh context. One-shot CLI needs the full history.
-        is_pty = isinstance(self.claude_code_client, ClaudeCodeClientPTY)
+        if pty_mode:
+            wiki_query = user_content
+        else:
+            wiki_query = next(
+                (msg.get("content", "") for msg in reversed(messages) if msg.get("role") == "user"),
+                "",
+            )
+
+        # Web search (LLM round-trips + HTTP), wiki retrieval and the memory
+        # lookup don't depend on each other, so wait for the slowest, not the sum.
+        # Skip manual search pipeline when using Claude Code — it handles search itself
+        (search_summary, search_sources), wiki_context, memory_context = await asyncio.gather(
+            self._web_search_context(user_content, enabled=not using_claude_code),
+            self._wiki_context(wiki_query),
+            # Several SQLite queries; keep them off the loop
+            asyncio.to_thread(
+                chat_history.get_memory_context,
+                str(server), channel_id=str(channel), active_user_ids=active_user_ids,
+            ),
+        )
+
+        if state is not None:
+            state.sources.extend(search_sources)
 
-        if is_pty and using_claude_code:
+        if pty_mode:
             # PTY mode: send only the latest user message with metadata
             last_msg = messages[-1]
             name = last_msg.get("name", "Unknown")
@@ -1253,7 +1664,6 @@ class OllamaBot(discord.Client):
             if search_summary:
                 prompt = f"Search Results Summary:\n{search_summary}\n\n{prompt}"
 
-            memory_context = chat_history.get_memory_context(str(server), channel_id=str(channel), active_user_ids=active_user_ids)
             if memory_context:
                 prompt = f"{prompt}\n\n{memory_context}"
 
@@ -1267,27 +1677,15 @@ class OllamaBot(discord.Client):
             if mention_context:
                 prompt = f"{prompt}\n\n{mention_context}"
 
-            if self.rag_enabled:
-                wiki_context = self.rag_system.get_context_for_query(user_content)
-                if wiki_context:
-                    prompt = f"Wiki Context:\n{wiki_context}\n\n{prompt}"
+            if wiki_context:
+                prompt = f"Wiki Context:\n{wiki_context}\n\n{prompt}"
         else:
-            # One-shot CLI / Ollama: send full conversation history
-            prompt = self.format_prompt(messages)
-
-            if search_summary:
-                prompt = f"Search Results Summary:\n{search_summary}\n\n{prompt}"
-
-            if self.rag_enabled:
-                user_question = ""
-                for msg in messages:
-                    if msg.get("role") == "user":
-                        user_question = msg.get("content", "")
-                if user_question:
-                    wiki_context = self.rag_system.get_context_for_query(user_question)
-                    if wiki_context:
-                        prompt = f"Wiki Context:\n{wiki_context}\n\n{prompt}"
-
+            # One-shot CLI / Ollama: send full conversation history.
+            # Layout is system prompt -> history -> per-turn context. Keeping
+            # the system prompt and history at the front (and everything that
+            # changes every turn after them) keeps the prompt prefix
+            # byte-identical across turns so Ollama can reuse its KV cache
+            # instead of re-evaluating the whole prompt.
             last_user_id = messages[-1].get("discord_user_id")
             system_prompt = self.system_prompt
             if last_user_id:
@@ -1295,18 +1693,33 @@ class OllamaBot(discord.Client):
                 if override:
                     system_prompt = override
                     logger.debug(f"[TTS-DEBUG] Using personality override for user {last_user_id}")
-            prompt = f"System: {system_prompt}\n" + prompt
+            head = [f"System: {system_prompt}\n"]
+            channel_summary = self._channel_summaries.get((server, channel)) if override_messages is None else None
+            if channel_summary:
+                head.append(f"Summary of earlier conversation: {channel_summary}\n\n")
+            head.append(self.format_prompt(messages))
+
+            # Per-turn sections, joined once at the end instead of re-copying
+            # the (large) history prefix on every concatenation
+            sections = ["".join(head)]
+
+            if search_summary:
+                sections.append(f"Search Results Summary:\n{search_summary}")
+
+            if wiki_context:
+                sections.append(f"Wiki Context:\n{wiki_context}")
 
-            memory_context = chat_history.get_memory_context(str(server), channel_id=str(channel), active_user_ids=active_user_ids)
             if memory_context:
-                prompt = f"{prompt}\n\n{memory_context}"
+                sections.append(memory_context)
 
-            prompt += f"\n\n[Current context: guild_id={server}, channel_id={channel}]"
+            sections.append(f"[Current context: guild_id={server}, channel_id={channel}]")
 
             guild = self.get_guild(server)
             mention_context = extract_mention_context(user_content, guild)
             if mention_context:
-                prompt = f"{prompt}\n\n{mention_context}"
+                sections.append(mention_context)
+
+            prompt = "\n\n".join(sections)
 
         if images:
             print("Sending image")
@@ -1347,15 +1760,20 @@ class OllamaBot(discord.Client):
 
             else:
                 ctx = VISION_MODEL_CTX if images else None
-                raw_response = await self.ollama_client.generate(prompt, model, images, keep_alive=-1, num_ctx=ctx)
+                raw_response = await self.ollama_client.generate(
+                    prompt, model, images, keep_alive=-1, num_ctx=ctx, on_chunk=on_chunk
+                )
 
                 if raw_response == "No response from Ollama.":
                     print("No response from Ollama")
                     return ["No response from Ollama."]
 
+            if state is not None:
+                state.raw_response = raw_response
+
             # Add response to context
             if override_messages is None:
-                self.context[server][channel].append({
+                await self.append_context(server, channel, {
                     "role": "assistant",
                     "content": raw_response,
                     "timestamp": time.time(),
@@ -1365,8 +1783,7 @@ class OllamaBot(discord.Client):
             return self.process_response(raw_response)
 
         except Exception as e:
-            print(f"Error: {e}")
-            print(traceback.format_exc())
+            logger.exception("query_ollama failed for %s/%s", server, channel)
             backend = "Claude Code" if using_claude_code else "Ollama"
             return [f"Error communicating with {backend}: {e}"]
 
@@ -1385,11 +1802,17 @@ class OllamaBot(discord.Client):
         if hasattr(self.claude_code_client, 'shutdown'):
             await self.claude_code_client.shutdown()
         await js_renderer.stop()
+        await context_store.close()
+        await self.ollama_client.close()
+        await self.image_gen.ollama_client.close()
+        self.claude_client.close()
+        self.image_gen.flux_client.shutdown()
         await super().close()
 
 
 def main():
     """Main entry point"""
+    setup_logging()
     bot = OllamaBot()
     bot.run(DISCORD_BOT_TOKEN)
     # After bot.run() returns, check if a restart was requested
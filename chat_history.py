@@ -13,7 +13,7 @@ import os
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Tuple
 
-from config import PROJECT_DIR, MEMORY_CHANNEL_ALLOWLIST, IMAGE_RECOGNITION_MODEL, OLLAMA_API_URL, VISION_MODEL_CTX
+from config import PROJECT_DIR, MEMORY_CHANNEL_ALLOWLIST, MEMORY_CHANNEL_ALLOWLIST_ENABLED, IMAGE_RECOGNITION_MODEL, OLLAMA_API_URL, VISION_MODEL_CTX
 
 ALIASES_PATH = os.path.join(PROJECT_DIR, "user_aliases.json")
 
@@ -215,10 +215,10 @@ async def record_message(message) -> None:
     Safe to call on every message — uses INSERT OR IGNORE so duplicates are skipped.
     Respects MEMORY_CHANNEL_ALLOWLIST: if set, only records messages from those channels.
     """
-    channel_id_str = str(message.channel.id)
-    if MEMORY_CHANNEL_ALLOWLIST and channel_id_str not in MEMORY_CHANNEL_ALLOWLIST:
-        print(f"[chat_history] Skipping message {message.id} — channel {channel_id_str} not in allowlist")
+    if MEMORY_CHANNEL_ALLOWLIST_ENABLED and message.channel.id not in MEMORY_CHANNEL_ALLOWLIST:
+        print(f"[chat_history] Skipping message {message.id} — channel {message.channel.id} not in allowlist")
         return
+    channel_id_str = str(message.channel.id)
 
     # Build attachment info if present
     attachment_info = None
@@ -18,6 +18,10 @@ class ClaudeClient:
         self.client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
         self.usage_tracker = UsageTracker(monthly_budget=CLAUDE_MONTHLY_BUDGET)
 
+    def close(self):
+        """Flush usage tracking to disk."""
+        self.usage_tracker.close()
+
     def _parse_prompt(self, prompt: str) -> Tuple[str, List[dict]]:
         """Parse a flat prompt string into (system, messages) for Claude's API.
 
@@ -4,18 +4,35 @@ import time
 import asyncio
 import logging
 import os
+import re
+from typing import List, Optional
 
 import aiohttp
 import discord
 from discord import app_commands
 
+from config import MAX_DISCORD_MESSAGE_LENGTH
 from models import Txt2TxtModel
+from response_splitter import MESSAGE_SPLIT_MARKER, split_long_message, strip_think_tags
 
 PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # Set up logging
 logger = logging.getLogger("CommandHandlers")
 
+# [EDIT_CODE] tag in a streaming preview; unclosed ones run to the end
+_EDIT_CODE_PREVIEW_RE = re.compile(r'\[EDIT_CODE\].*?(?:\[/EDIT_CODE\]|$)', re.DOTALL)
+
+
+def _stream_preview(text: str) -> str:
+    """Partial response as the user should see it mid-stream: no thinking
+    blocks (even unfinished ones), split markers or edit tags."""
+    text = strip_think_tags(text)
+    if "<think>" in text:
+        text = text[:text.index("<think>")]
+    text = _EDIT_CODE_PREVIEW_RE.sub("", text)
+    return text.replace(MESSAGE_SPLIT_MARKER, "\n")
+
 
 class ModelSelectView(discord.ui.View):
     """Dropdown view for model selection."""
@@ -290,6 +307,9 @@ class CommandHandlers:
 
     def __init__(self, bot):
         self.bot = bot
+        # Rendered /plugins listing and the plugin_manager.version it reflects
+        self._plugins_render: Optional[str] = None
+        self._plugins_render_version = -1
         logger.info("CommandHandlers initialized")
 
     def setup_commands(self):
@@ -298,28 +318,44 @@ class CommandHandlers:
 
         @self.bot.tree.command(name="clear", description="Clear context")
         async def clear(interaction: discord.Interaction):
-            logger.info(f"Clear command called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Clear command called by {interaction.user.name}")
             server = interaction.guild.id
             channel = interaction.channel.id
 
-            if server in self.bot.context and channel in self.bot.context[server]:
-                self.bot.context[server][channel] = []
-                logger.debug(f"Cleared context for server {server}, channel {channel}")
+            await self.bot.clear_context(server, channel)
+            logger.debug("Cleared context for server %s, channel %s", server, channel)
             await interaction.response.send_message("Context cleared")
             logger.info("Context cleared successfully")
 
         @self.bot.tree.command(name="ask", description="Ask something")
         @app_commands.describe(question="Ask something")
         async def ask(interaction: discord.Interaction, question: str):
-            logger.info(f"Ask command called by {interaction.user.name}#{interaction.user.discriminator} with question: {question[:50]}...")
+            logger.info(f"Ask command called by {interaction.user.name} with question: {question[:50]}...")
             await interaction.response.defer(thinking=True)
 
             start = time.perf_counter()
-            response = await self.bot.query_ollama(
-                interaction.guild.id,
-                interaction.channel.id,
-                [{"role": "user", "content": question, "images": []}]
-            )
+            streamed = False
+
+            # Called at most every STREAM_CALLBACK_INTERVAL by the stream reader
+            async def on_chunk(text: str):
+                nonlocal streamed
+                text = _stream_preview(text)
+                if not text.strip():
+                    return
+                try:
+                    await interaction.edit_original_response(content=text[:MAX_DISCORD_MESSAGE_LENGTH])
+                    streamed = True
+                except discord.HTTPException as e:
+                    logger.debug("Streaming edit failed: %s", e)
+
+            # Counts against MAX_CONCURRENT_QUERIES like channel messages do
+            async with self.bot._query_semaphore:
+                response = await self.bot.query_ollama(
+                    interaction.guild.id,
+                    interaction.channel.id,
+                    [{"role": "user", "content": question, "images": []}],
+                    on_chunk=on_chunk,
+                )
             end = time.perf_counter()
             elapsed = end - start
             logger.info(f"Ask command processed in {elapsed:.3f} seconds")
@@ -328,14 +364,26 @@ class CommandHandlers:
                 logger.debug("Sending embed and file response")
                 await interaction.followup.send(embed=response[0], file=response[1])
             else:
-                response_text = "\n".join(response) if isinstance(response, list) else response
-                response_text += f"\n\n_Responded in {elapsed:.3f} seconds_"
-                logger.debug(f"Sending text response: {response_text[:100]}...")
-                await interaction.followup.send(response_text)
+                # query_ollama returns message parts; join them with the footer in one pass
+                response_text = "\n".join([*response, f"\n_Responded in {elapsed:.3f} seconds_"])
+                logger.debug("Sending text response: %.100s...", response_text)
+                chunks = split_long_message(response_text)
+                if streamed:
+                    # Replace the partial preview with the processed final text
+                    try:
+                        await interaction.edit_original_response(content=chunks[0])
+                    except discord.HTTPException as e:
+                        logger.warning("Final /ask edit failed, sending instead: %s", e)
+                        await interaction.followup.send(chunks[0])
+                    overflow = chunks[1:]
+                else:
+                    overflow = chunks
+                for chunk in overflow:
+                    await interaction.followup.send(chunk)
 
         @self.bot.tree.command(name='set_system_prompt')
         async def set_system_prompt(interaction: discord.Interaction, prompt: str):
-            logger.info(f"Set system prompt command called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Set system prompt command called by {interaction.user.name}")
             await interaction.response.defer(thinking=True)
             self.bot.system_prompt = prompt
             logger.debug("System prompt updated")
@@ -343,7 +391,7 @@ class CommandHandlers:
 
         @self.bot.tree.command(name='reset_system_prompt')
         async def reset_system_prompt(interaction: discord.Interaction):
-            logger.info(f"Reset system prompt command called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Reset system prompt command called by {interaction.user.name}")
             await interaction.response.defer(thinking=True)
             self.bot.system_prompt = self.bot.original_system_prompt
             logger.debug("System prompt reset to default")
@@ -351,10 +399,9 @@ class CommandHandlers:
 
         @self.bot.tree.command(name='get_system_prompt')
         async def get_system_prompt(interaction: discord.Interaction):
-            logger.info(f"Get system prompt command called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Get system prompt command called by {interaction.user.name}")
             await interaction.response.defer(thinking=True)
             logger.debug("Sending current system prompt")
-            from response_splitter import split_long_message
             chunks = split_long_message(self.bot.system_prompt)
             for chunk in chunks:
                 await interaction.followup.send(chunk)
@@ -362,7 +409,7 @@ class CommandHandlers:
         @self.bot.tree.command(name="set_model", description="Switch the active LLM model")
         async def set_model(interaction: discord.Interaction):
             """Switch the active LLM model — shows an embed with a dropdown selector"""
-            logger.info(f"Set model command called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Set model command called by {interaction.user.name}")
             await interaction.response.defer(thinking=True, ephemeral=True)
 
             # Fetch available local models from Ollama
@@ -429,14 +476,14 @@ class CommandHandlers:
         @self.bot.tree.command(name="get_model", description="Show the current active LLM model")
         async def get_model(interaction: discord.Interaction):
             """Show the current active model"""
-            logger.info(f"Get model command called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Get model command called by {interaction.user.name}")
             await interaction.response.send_message(f"Current model: **{self.bot.active_model}**")
 
         @self.bot.tree.command(name="purge", description="Delete all messages in this channel")
         @app_commands.default_permissions(manage_messages=True)
         async def purge(interaction: discord.Interaction):
             """Delete all messages in the current channel."""
-            logger.info(f"Purge command called by {interaction.user.name}#{interaction.user.discriminator} in #{interaction.channel.name}")
+            logger.info(f"Purge command called by {interaction.user.name} in #{interaction.channel.name}")
             if not interaction.channel.permissions_for(interaction.user).manage_messages:
                 await interaction.response.send_message("You need the Manage Messages permission to use this.", ephemeral=True)
                 return
@@ -453,31 +500,26 @@ class CommandHandlers:
         @self.bot.tree.command(name="list_documents", description="List folders in My Documents (sandbox test)")
         async def list_documents(interaction: discord.Interaction):
             """Attempt to list /mnt/c/Users/Daniel/Documents — should be blocked by bwrap sandbox."""
+            # ACK first: listing a /mnt/c path goes through the WSL filesystem
+            # bridge and can outlast Discord's 3s interaction deadline
+            await interaction.response.defer(thinking=True)
             docs_path = "/mnt/c/Users/Daniel/Documents"
             try:
-                entries = os.listdir(docs_path)
-                await interaction.response.send_message(f"SANDBOX FAILURE: got {len(entries)} entries from {docs_path}")
+                entries = await asyncio.to_thread(os.listdir, docs_path)
+                await interaction.followup.send(f"SANDBOX FAILURE: got {len(entries)} entries from {docs_path}")
             except (FileNotFoundError, OSError) as e:
-                await interaction.response.send_message(f"Sandbox working: {e}")
+                await interaction.followup.send(f"Sandbox working: {e}")
 
         # ── Plugin management commands ────────────────────────────────
 
         @self.bot.tree.command(name="plugins", description="List loaded plugins")
         async def plugins(interaction: discord.Interaction):
             """Show all loaded plugins and their status."""
-            info = self.bot.plugin_manager.list_plugins()
-            if not info:
-                await interaction.response.send_message("No plugins loaded.")
-                return
-            lines = []
-            for p in info:
-                status = "DISABLED" if p["disabled"] else "active"
-                cmds = ", ".join(f"/{c}" for c in p["commands"]) if p["commands"] else "none"
-                lines.append(
-                    f"**{p['name']}** v{p['version']} [{status}] — {p['description'] or 'no description'}\n"
-                    f"  commands: {cmds} | handlers: {p['message_handlers']} | hooks: {p['hooks']}"
-                )
-            await interaction.response.send_message("\n".join(lines))
+            manager = self.bot.plugin_manager
+            if self._plugins_render_version != manager.version:
+                self._plugins_render = self._render_plugins(manager.list_plugins())
+                self._plugins_render_version = manager.version
+            await interaction.response.send_message(self._plugins_render)
 
         @self.bot.tree.command(name="reload_plugin", description="Hot-reload a plugin")
         @app_commands.describe(name="Plugin name to reload")
@@ -518,7 +560,7 @@ class CommandHandlers:
         @self.bot.tree.command(name="sync_commands")
         async def sync_commands(interaction: discord.Interaction):
             """Manually sync slash commands to Discord (rate-limited, use sparingly)"""
-            logger.info(f"Sync commands called by {interaction.user.name}#{interaction.user.discriminator}")
+            logger.info(f"Sync commands called by {interaction.user.name}")
             await interaction.response.defer(thinking=True)
             await self.bot.tree.sync()
             self.bot.plugin_manager._pending_sync = False
@@ -526,6 +568,21 @@ class CommandHandlers:
 
         logger.info("All Discord slash commands registered successfully")
 
+    @staticmethod
+    def _render_plugins(info: List[dict]) -> str:
+        """Format list_plugins() output for /plugins."""
+        if not info:
+            return "No plugins loaded."
+        lines = []
+        for p in info:
+            status = "DISABLED" if p["disabled"] else "active"
+            cmds = ", ".join(f"/{c}" for c in p["commands"]) if p["commands"] else "none"
+            lines.append(
+                f"**{p['name']}** v{p['version']} [{status}] — {p['description'] or 'no description'}\n"
+                f"  commands: {cmds} | handlers: {p['message_handlers']} | hooks: {p['hooks']}"
+            )
+        return "\n".join(lines)
+
     async def _fetch_ollama_models(self) -> list:
         """Query Ollama API for available local models."""
         try:
@@ -1,35 +1,61 @@
 """Configuration settings for Discord LLM Bot"""
 
+import atexit
+import functools
 import os
 import logging
+import logging.handlers
+import queue
 from dotenv import load_dotenv
 
-from models import Txt2TxtModel
+from models import TXT2TXT_VALUES
+
+@functools.lru_cache(maxsize=None)
+def setup_logging():
+    """Configure process-wide logging. Call once from an entry point
+    (bot.py, test_cli.py); importing config has no logging side effects,
+    so tool scripts and subprocesses keep their own setup.
+
+    Root logger: INFO by default. Our own modules (below) go to DEBUG so the
+    image-gen pipeline is fully traced. Third-party libraries stay quieter.
+    Records go through a queue and are written to stderr by a listener
+    thread, so a slow terminal/pipe never blocks the event loop inside a log
+    call.
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(
+        "[%(asctime)s] [%(name)s] [%(levelname)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    ))
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # QueueHandler pre-formats the record; only the listener's handler adds the prefix
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    log_listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+
+    # Set our own loggers to DEBUG for really verbose tracing.
+    for name in ("Bot", "ollama", "flux", "imagegen"):
+        logging.getLogger(name).setLevel(logging.DEBUG)
+
+    # But route the debug output through a handler that doesn't filter it.
+    # basicConfig's root handler has level INFO, so we need to lower it (or add
+    # a dedicated handler). Simplest: drop the root handler level to DEBUG and
+    # silence noisy third-party libraries explicitly.
+    logging.getLogger().setLevel(logging.DEBUG)
+    for noisy in (
+        "discord", "discord.client", "discord.gateway", "discord.http",
+        "aiohttp", "aiohttp.access", "aiohttp.client", "aiohttp.internal",
+        "urllib3", "httpx", "httpcore", "chromadb", "sentence_transformers",
+        "PIL", "asyncio",
+    ):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    _log_loaded_config()
 
-# Root logger: INFO by default. Our own modules (below) go to DEBUG so the
-# image-gen pipeline is fully traced. Third-party libraries stay quieter.
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s] [%(name)s] [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-
-# Set our own loggers to DEBUG for really verbose tracing.
-for _name in ("Bot", "ollama", "flux", "imagegen"):
-    logging.getLogger(_name).setLevel(logging.DEBUG)
-
-# But route the debug output through a handler that doesn't filter it.
-# basicConfig's root handler has level INFO, so we need to lower it (or add
-# a dedicated handler). Simplest: drop the root handler level to DEBUG and
-# silence noisy third-party libraries explicitly.
-logging.getLogger().setLevel(logging.DEBUG)
-for _noisy in (
-    "discord", "discord.client", "discord.gateway", "discord.http",
-    "aiohttp", "aiohttp.access", "aiohttp.client", "aiohttp.internal",
-    "urllib3", "httpx", "httpcore", "chromadb", "sentence_transformers",
-    "PIL", "asyncio",
-):
-    logging.getLogger(_noisy).setLevel(logging.WARNING)
 
 # Create a logger for the config module
 logger = logging.getLogger("Config")
@@ -39,14 +65,10 @@ load_dotenv()
 # Discord Configuration
 DISCORD_BOT_TOKEN = os.getenv("DISCORD_BOT_TOKEN", "")
 GUILD_ID = int(os.getenv("GUILD_ID", "363154169294618625"))
-logger.info(f"Discord configuration loaded. Guild ID: {GUILD_ID}")
 
 # Ollama Configuration
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen3.5:35b-a3b-q8_0")
-logger.info(
-    f"Ollama configuration loaded. API URL: {OLLAMA_API_URL}, Model: {OLLAMA_MODEL}"
-)
 
 # Model Configuration
 IMAGE_RECOGNITION_MODEL = os.getenv("IMAGE_RECOGNITION_MODEL", "qwen3-vl:32b")
@@ -60,15 +82,14 @@ NSFW_CLASSIFICATION_MODEL = os.getenv("NSFW_CLASSIFICATION_MODEL", "gemma3:27b")
 # we give it a generous num_predict budget (1500) to cover hidden
 # chain-of-thought tokens plus the actual output.
 IMAGE_EDIT_DESCRIPTION_MODEL = os.getenv("IMAGE_EDIT_DESCRIPTION_MODEL", "qwen3-vl:32b")
-CHAT_MODEL = Txt2TxtModel.GEMMA3_27B.value
-SEARCH_UTILITY_MODEL = Txt2TxtModel.GEMMA3_27B.value
-SEARCH_SUMMARIZATION_MODEL = Txt2TxtModel.QWEN3_VL.value
+CHAT_MODEL = TXT2TXT_VALUES["GEMMA3_27B"]
+SEARCH_UTILITY_MODEL = TXT2TXT_VALUES["GEMMA3_27B"]
+SEARCH_SUMMARIZATION_MODEL = TXT2TXT_VALUES["QWEN3_VL"]
 TEXT_TO_IMAGE_MODEL = "..."
 TEXT_TO_IMAGE_PROMPT_GENERATION_MODEL = os.getenv(
     "TEXT_TO_IMAGE_PROMPT_GENERATION_MODEL",
     "gemma3:27b",
 )
-logger.info("Model configurations loaded")
 
 # Flux2 Klein 9B Configuration
 # Klein is a distilled/fast variant. The HF model card uses guidance_scale=1.0
@@ -89,10 +110,21 @@ FILE_INPUT_FOLDER = os.path.join(PROJECT_DIR, "multimodal_input")
 OUTPUT_DIR = os.path.join(PROJECT_DIR, "api_out")
 OUTPUT_DIR_T2I = os.path.join(OUTPUT_DIR, "txt2img")
 OUTPUT_DIR_I2I = os.path.join(OUTPUT_DIR, "img2img")
+WIKI_DUMP_PATH = os.getenv("WIKI_DUMP_PATH", os.path.join(PROJECT_DIR, "maplestorywikinet.xml"))
+
+# RAG embedding device: "cuda", "cpu", or empty to use CUDA when available
+RAG_EMBED_DEVICE = os.getenv("RAG_EMBED_DEVICE", "").strip().lower()
+
+# Keep only the newest N rows of telemetry's ollama_calls table (0 = keep all)
+TELEMETRY_OLLAMA_CALLS_MAX_ROWS = int(os.getenv("TELEMETRY_OLLAMA_CALLS_MAX_ROWS", "0"))
 
 # Context Configuration
 CONTEXT_LIMIT = 10
+CONTEXT_SUMMARY_BATCH = 4  # Evicted messages to collect before folding them into the channel summary
+CONTEXT_SINK_SIZE = 2  # Oldest entries of a window that are never evicted (conversation anchors)
+CONTEXT_RECENT_WITH_SUMMARY = 4  # Verbatim entries kept after the anchors once a channel has a summary
 VISION_MODEL_CTX = 32768  # Cap context window for vision models to avoid OOM (default 256K is way too much)
+MAX_CONCURRENT_QUERIES = 4  # Max query_ollama calls in flight across all channels
 
 # Discord Message Configuration
 MAX_DISCORD_MESSAGE_LENGTH = 1900
@@ -107,14 +139,25 @@ MEMORY_MAX_EVENTS = 50              # Keep only the most recent N events per gui
 # Channel allowlist for chat history recording. Empty list = record ALL channels.
 # Set via comma-separated channel IDs in .env: MEMORY_CHANNEL_ALLOWLIST=123,456,789
 _allowlist_raw = os.getenv("MEMORY_CHANNEL_ALLOWLIST", "")
-MEMORY_CHANNEL_ALLOWLIST: set = set(
-    cid.strip() for cid in _allowlist_raw.split(",") if cid.strip()
+_allowlist_entries = [c.strip() for c in _allowlist_raw.split(",") if c.strip()]
+# Any non-empty value enforces the allowlist, even if no entry parses, so a
+# typo (a channel name, "<#123>") records nothing rather than everything
+MEMORY_CHANNEL_ALLOWLIST_ENABLED = bool(_allowlist_entries)
+# Parsed once into a frozenset of ints so the per-message check is a hash lookup
+MEMORY_CHANNEL_ALLOWLIST: frozenset = frozenset(
+    int(cid) for cid in _allowlist_entries if cid.isdigit()
 )
+_allowlist_invalid = [cid for cid in _allowlist_entries if not cid.isdigit()]
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_output_dirs():
+    """Create the image output directories on first save (once per process),
+    rather than on every `import config`."""
+    os.makedirs(OUTPUT_DIR_T2I, exist_ok=True)
+    os.makedirs(OUTPUT_DIR_I2I, exist_ok=True)
+    logger.info(f"Output directories created: {OUTPUT_DIR_T2I}, {OUTPUT_DIR_I2I}")
 
-# Create output directories
-os.makedirs(OUTPUT_DIR_T2I, exist_ok=True)
-os.makedirs(OUTPUT_DIR_I2I, exist_ok=True)
-logger.info(f"Output directories created: {OUTPUT_DIR_T2I}, {OUTPUT_DIR_I2I}")
 
 # Tavily Web Search
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
@@ -123,7 +166,22 @@ TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", "")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 CLAUDE_MONTHLY_BUDGET = float(os.getenv("CLAUDE_MONTHLY_BUDGET", "50.0"))
 
+# Claude Code: persistent tmux (PTY) session instead of one-shot CLI calls
+CLAUDE_USE_PTY = os.getenv("CLAUDE_USE_PTY", "").lower() in ("1", "true", "yes")
+
 # Splitwise
 SPLITWISE_API_KEY = os.getenv("SPLITWISE_API_KEY", "")
 
-logger.info("Configuration module initialization complete")
+
+def _log_loaded_config():
+    """Startup summary, logged by setup_logging() once handlers exist
+    (at import time nothing below WARNING would reach the log)."""
+    logger.info(f"Discord configuration loaded. Guild ID: {GUILD_ID}")
+    logger.info(
+        f"Ollama configuration loaded. API URL: {OLLAMA_API_URL}, Model: {OLLAMA_MODEL}"
+    )
+    if _allowlist_invalid:
+        logger.warning(
+            f"Ignoring non-numeric MEMORY_CHANNEL_ALLOWLIST entries: {_allowlist_invalid}"
+        )
+    logger.info("Configuration module initialization complete")
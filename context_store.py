@@ -0,0 +1,248 @@
+"""Persistent conversation context.
+
+Mirrors the bot's per-channel context windows into SQLite so they survive
+restarts. One row per context entry; only CONTEXT_LIMIT rows are kept per
+channel (the CONTEXT_SINK_SIZE oldest anchors plus the newest rest), so each append is a single indexed insert + trim instead
+of rewriting every channel's history.
+
+Writes are queued and a background task commits them in batches (at most
+one transaction per FLUSH_INTERVAL), so a burst of messages costs one
+fsync instead of one per entry. close() flushes anything still queued.
+
+Base64 image payloads are not persisted (they are large and can be
+re-encoded from `image_files`); restored entries come back with no images.
+
+Each channel's rolling summary of evicted messages is stored alongside its
+rows, so a restored window and its summary still line up. Once a channel
+has a summary its window is shorter; appends carry the row limit to trim to.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from config import PROJECT_DIR, CONTEXT_LIMIT, CONTEXT_SINK_SIZE
+
+# Try to import optional dependencies
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+    _loads = json.loads
+
+DB_PATH = os.path.join(PROJECT_DIR, "context.db")
+
+# Anchor rows kept at the start of each channel (mirrors OllamaBot.append_context)
+_SINK = min(CONTEXT_SINK_SIZE, CONTEXT_LIMIT - 1)
+
+# Seconds to collect queued writes before committing them together
+FLUSH_INTERVAL = 1.0
+
+# Module-level connection (lazy-initialized, one per process)
+_conn: Optional[sqlite3.Connection] = None
+
+# Pending (op, guild_id, channel_id, payload, keep) writes and the task draining them
+_queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+def _get_conn() -> sqlite3.Connection:
+    """Get or create the module-level DB connection."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _init_schema(_conn)
+    return _conn
+
+
+def _init_schema(conn: sqlite3.Connection):
+    """Create tables and indexes if they don't exist."""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS context_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            entry TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_context_channel
+            ON context_entries(guild_id, channel_id, id);
+
+        CREATE TABLE IF NOT EXISTS channel_summaries (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            PRIMARY KEY (guild_id, channel_id)
+        );
+    """)
+    conn.commit()
+
+
+def _write_batch_sync(ops: List[Tuple[str, int, int, object, int]]):
+    """Apply queued appends/clears/summaries in one transaction, then trim
+    each touched channel to its row limit, keeping the sink anchors."""
+    conn = _get_conn()
+    touched: Dict[Tuple[int, int], int] = {}
+    try:
+        for op, guild_id, channel_id, entry, keep in ops:
+            if op == "summary":
+                conn.execute(
+                    "INSERT OR REPLACE INTO channel_summaries (guild_id, channel_id, summary) VALUES (?, ?, ?)",
+                    (guild_id, channel_id, entry),
+                )
+            elif op == "append":
+                try:
+                    payload = _dumps(entry)
+                except (TypeError, ValueError) as e:
+                    # Drop just this entry rather than the whole batch
+                    print(f"[context_store] Skipping unserializable context entry: {e}")
+                    continue
+                conn.execute(
+                    "INSERT INTO context_entries (guild_id, channel_id, entry) VALUES (?, ?, ?)",
+                    (guild_id, channel_id, payload),
+                )
+                touched[(guild_id, channel_id)] = keep
+            else:
+                conn.execute(
+                    "DELETE FROM context_entries WHERE guild_id = ? AND channel_id = ?",
+                    (guild_id, channel_id),
+                )
+                conn.execute(
+                    "DELETE FROM channel_summaries WHERE guild_id = ? AND channel_id = ?",
+                    (guild_id, channel_id),
+                )
+        for (guild_id, channel_id), keep in touched.items():
+            sink = min(_SINK, keep - 1)
+            conn.execute(
+                """DELETE FROM context_entries
+                   WHERE guild_id = ? AND channel_id = ? AND id NOT IN (
+                       SELECT id FROM context_entries
+                       WHERE guild_id = ? AND channel_id = ?
+                       ORDER BY id DESC
+                       LIMIT ?
+                   ) AND id NOT IN (
+                       SELECT id FROM context_entries
+                       WHERE guild_id = ? AND channel_id = ?
+                       ORDER BY id ASC
+                       LIMIT ?
+                   )""",
+                (guild_id, channel_id,
+                 guild_id, channel_id, keep - sink,
+                 guild_id, channel_id, sink),
+            )
+        conn.commit()
+    except Exception as e:
+        # Not just sqlite3.Error: an unserializable entry must not leave the
+        # transaction open or take the writer task down
+        conn.rollback()
+        print(f"[context_store] Error persisting {len(ops)} context writes: {e}")
+
+
+def _drain() -> list:
+    """Take everything currently queued."""
+    ops = []
+    while _queue is not None and not _queue.empty():
+        ops.append(_queue.get_nowait())
+    return ops
+
+
+async def _writer():
+    """Commit queued writes, batching whatever arrives within FLUSH_INTERVAL."""
+    while True:
+        ops = [await _queue.get()]
+        try:
+            await asyncio.sleep(FLUSH_INTERVAL)
+        finally:
+            # Also runs when close() cancels us mid-wait, so nothing taken
+            # off the queue is lost
+            ops.extend(_drain())
+            try:
+                await asyncio.to_thread(_write_batch_sync, ops)
+            except Exception as e:
+                print(f"[context_store] Error persisting {len(ops)} context writes: {e}")
+
+
+def _enqueue(op: str, guild_id: int, channel_id: int, entry: object = None,
+             keep: int = CONTEXT_LIMIT):
+    """Queue a write, starting the writer task on first use."""
+    global _queue, _writer_task
+    if _queue is None:
+        _queue = asyncio.Queue()
+    if _writer_task is None or _writer_task.done():
+        # (Re)start the writer; a dead one would leave writes stuck in _queue
+        _writer_task = asyncio.create_task(_writer())
+    _queue.put_nowait((op, guild_id, channel_id, entry, keep))
+
+
+def load_all() -> Dict[int, Dict[int, Deque[dict]]]:
+    """Load every persisted channel window, oldest entry first.
+
+    Called once at startup, before the event loop is busy.
+    """
+    conn = _get_conn()
+    context: Dict[int, Dict[int, Deque[dict]]] = {}
+    rows = conn.execute(
+        "SELECT guild_id, channel_id, entry FROM context_entries ORDER BY id ASC"
+    ).fetchall()
+    for row in rows:
+        try:
+            entry = _loads(row["entry"])
+        except ValueError:
+            continue
+        entry.setdefault("images", [])
+        channels = context.setdefault(row["guild_id"], {})
+        channels.setdefault(row["channel_id"], deque(maxlen=CONTEXT_LIMIT)).append(entry)
+    return context
+
+
+def load_summaries() -> Dict[Tuple[int, int], str]:
+    """Load every persisted channel summary, keyed by (guild_id, channel_id)."""
+    conn = _get_conn()
+    rows = conn.execute("SELECT guild_id, channel_id, summary FROM channel_summaries").fetchall()
+    return {(row["guild_id"], row["channel_id"]): row["summary"] for row in rows}
+
+
+async def append(guild_id: int, channel_id: int, entry: dict, keep: int = CONTEXT_LIMIT) -> None:
+    """Queue a new context entry for persistence; the channel is then
+    trimmed to `keep` rows (sink anchors plus the newest)."""
+    # Copy now (minus images) so later mutation of the live entry can't leak in
+    stored = {k: v for k, v in entry.items() if k != "images"}
+    _enqueue("append", guild_id, channel_id, stored, keep)
+
+
+async def save_summary(guild_id: int, channel_id: int, summary: str) -> None:
+    """Queue the channel's rolling summary for persistence."""
+    _enqueue("summary", guild_id, channel_id, summary)
+
+
+async def clear_channel(guild_id: int, channel_id: int) -> None:
+    """Forget the persisted context and summary for a channel (ordered after queued writes)."""
+    _enqueue("clear", guild_id, channel_id)
+
+
+async def close() -> None:
+    """Stop the writer and commit anything still queued."""
+    global _writer_task
+    if _writer_task is not None:
+        _writer_task.cancel()
+        try:
+            await _writer_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        _writer_task = None
+    ops = _drain()
+    if ops:
+        await asyncio.to_thread(_write_batch_sync, ops)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 import logging
 from typing import Optional
@@ -6,18 +7,36 @@ from sandbox import safe_path
 
 logger = logging.getLogger(__name__)
 
+# Try to import optional dependencies
+try:
+    import pymupdf  # C-backed MuPDF; much faster text extraction than pypdf
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+
 class FileParser:
     """Parses various file formats to extract text content."""
 
-    SUPPORTED_TEXT_EXTENSIONS = {
+    # Text attachments larger than this are truncated before decoding
+    MAX_TEXT_BYTES = 16 * 1024 * 1024
+
+    SUPPORTED_TEXT_EXTENSIONS = frozenset({
         '.txt', '.md', '.py', '.js', '.json', '.html', '.xml', 
         '.css', '.csv', '.yaml', '.yml', '.sh', '.bat', '.log',
         '.ini', '.cfg', '.conf'
-    }
+    })
 
     @staticmethod
     def get_file_extension(file_path: str) -> str:
-        return os.path.splitext(file_path)[1].lower()
+        # Same result as os.path.splitext(file_path)[1].lower(), without the
+        # tuple: a dot only counts if it is past the last path separator and
+        # not the basename's leading dot (".bashrc" has no extension)
+        dot = file_path.rfind('.')
+        sep = max(file_path.rfind('/'), file_path.rfind(os.sep))
+        if dot <= sep + 1 or (file_path[sep + 1] == '.'
+                              and not file_path[sep + 1:dot].strip('.')):
+            return ''
+        return file_path[dot:].lower()
 
     @classmethod
     def parse_file(cls, file_path: str) -> Optional[str]:
@@ -26,44 +45,67 @@ class FileParser:
         Returns the extracted text or None if the file type is unsupported or extraction fails.
         """
         file_path = safe_path(file_path)
-        if not os.path.exists(file_path):
-            logger.error(f"File not found: {file_path}")
-            return None
-
         ext = cls.get_file_extension(file_path)
 
+        # Anything that isn't a PDF is parsed as text: SUPPORTED_TEXT_EXTENSIONS
+        # are known text, and unknown extensions are usually code files.
+        parser = cls._parse_pdf if ext == '.pdf' else cls._parse_text
         try:
-            if ext == '.pdf':
-                return cls._parse_pdf(file_path)
-            elif ext in cls.SUPPORTED_TEXT_EXTENSIONS:
-                return cls._parse_text(file_path)
-            else:
-                # Try parsing as text if it's not a known binary format
-                # This is a bit risky but useful for code files with weird extensions
-                return cls._parse_text(file_path)
+            return parser(file_path)
+        except FileNotFoundError:
+            # Caught from the open itself instead of a separate exists() stat
+            logger.error(f"File not found: {file_path}")
+            return None
         except Exception as e:
             logger.error(f"Error parsing file {file_path}: {e}")
             return f"[Error parsing file: {e}]"
 
+    @classmethod
+    async def parse_file_async(cls, file_path: str) -> Optional[str]:
+        """parse_file on a worker thread, for callers on the event loop
+        (PDF extraction and large reads are blocking)."""
+        return await asyncio.to_thread(cls.parse_file, file_path)
+
     @staticmethod
     def _parse_pdf(file_path: str) -> str:
         """Extracts text from a PDF file."""
         text_content = []
         try:
-            reader = pypdf.PdfReader(file_path)
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
+            if PYMUPDF_AVAILABLE:
+                with pymupdf.open(file_path) as doc:
+                    for page in doc:
+                        text = page.get_text("text")
+                        if text:
+                            text_content.append(text)
+            else:
+                reader = pypdf.PdfReader(file_path)
+                for page in reader.pages:
+                    text = page.extract_text()
+                    if text:
+                        text_content.append(text)
             return "\n".join(text_content)
+        except FileNotFoundError:
+            raise
         except Exception as e:
             raise Exception(f"PDF parsing failed: {str(e)}")
 
-    @staticmethod
-    def _parse_text(file_path: str) -> str:
-        """Extracts text from a text-based file."""
+    @classmethod
+    def _parse_text(cls, file_path: str) -> str:
+        """Extracts text from a text-based file.
+
+        Read as bytes in one call and decoded once; text mode would decode
+        and translate newlines chunk by chunk in Python.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                return f.read()
+            with open(file_path, 'rb') as f:
+                data = f.read(cls.MAX_TEXT_BYTES + 1)
+            truncated = len(data) > cls.MAX_TEXT_BYTES
+            text = data[:cls.MAX_TEXT_BYTES].decode('utf-8', errors='replace').replace('\r\n', '\n')
+            if truncated:
+                logger.warning(f"Truncated {file_path} to {cls.MAX_TEXT_BYTES} bytes")
+                text += "\n[... truncated]"
+            return text
+        except FileNotFoundError:
+            raise
         except Exception as e:
             raise Exception(f"Text parsing failed: {str(e)}")
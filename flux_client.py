@@ -2,16 +2,20 @@
 
 Wraps the Flux2KleinPipeline from diffusers for text-to-image and
 image-to-image generation. Lazy-loads the model on first use and
-auto-unloads after 5 minutes of inactivity to free VRAM.
+auto-unloads after 5 minutes of inactivity to free VRAM. Concurrent
+txt2img requests with the same size/steps/guidance share one batched
+pipeline call.
 """
 
 import asyncio
+import functools
 import json
 import logging
 import os
 import time
 import threading
-from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
 
 import torch
 from PIL import Image
@@ -24,6 +28,7 @@ from config import (
     FLUX_MODEL_ID,
     FLUX_DEFAULT_STEPS,
     FLUX_DEFAULT_GUIDANCE,
+    ensure_output_dirs,
 )
 from models import ImageInfo
 
@@ -36,6 +41,24 @@ logger = logging.getLogger("flux")
 UNLOAD_TIMEOUT = 0  # disabled
 
 
+# Concurrent txt2img requests with identical sampling params are coalesced
+# into one batched pipeline call. Requests arriving within COALESCE_WINDOW
+# seconds of the first are grouped; batches stay small for large outputs,
+# where activation memory grows with pixel count and the speedup flattens.
+COALESCE_WINDOW = 0.05
+MAX_BATCH = 4
+MAX_BATCH_LARGE = 2
+LARGE_BATCH_PIXELS = 768 * 768
+
+
+def _clamp_params(width: int, height: int, steps: int) -> Tuple[int, int, int]:
+    """Clamp to what Flux2 Klein accepts: 256-1536 per side in multiples of 64, 1-20 steps."""
+    width = (min(1536, max(256, width)) // 64) * 64
+    height = (min(1536, max(256, height)) // 64) * 64
+    steps = min(20, max(1, steps))
+    return width, height, steps
+
+
 def _vram_str() -> str:
     """Return a compact VRAM usage string."""
     try:
@@ -57,6 +80,88 @@ class FluxClient:
         self._last_used: float = 0
         self._lock = threading.Lock()
         self._unload_timer: Optional[threading.Timer] = None
+        # Pipeline calls run for seconds to minutes and the GPU serves one at a
+        # time anyway; a dedicated worker keeps them from tying up the default
+        # executor that every other asyncio.to_thread offload shares.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="flux")
+        # (width, height, steps, guidance) -> [(job, future)] awaiting a batch
+        self._pending: Dict[tuple, List[tuple]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    async def _run_sync(self, **kwargs) -> Tuple[str, ImageInfo]:
+        """Run _generate_sync on the dedicated flux worker."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(self._generate_sync, **kwargs)
+        )
+
+    async def _submit_txt2img(
+        self, prompt: str, seed: int, width: int, height: int, steps: int, guidance_scale: float,
+    ) -> Tuple[str, ImageInfo]:
+        """Queue a txt2img job to be batched with same-param requests."""
+        # Clamp before keying so requests that clamp to the same size share a batch
+        orig_w, orig_h = width, height
+        width, height, steps = _clamp_params(width, height, steps)
+        if (width, height) != (orig_w, orig_h):
+            logger.info("clamped dims %dx%d -> %dx%d", orig_w, orig_h, width, height)
+        key = (width, height, steps, guidance_scale)
+        future = asyncio.get_running_loop().create_future()
+        group = self._pending.setdefault(key, [])
+        group.append(({"prompt": prompt, "seed": seed}, future))
+        if len(group) == 1:
+            task = asyncio.create_task(self._flush_txt2img(key))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        return await future
+
+    async def _flush_txt2img(self, key: tuple):
+        """After the coalescing window, run the queued jobs for `key` in batches."""
+        await asyncio.sleep(COALESCE_WINDOW)
+        pending = self._pending.pop(key)
+        width, height, steps, guidance_scale = key
+        limit = MAX_BATCH if width * height <= LARGE_BATCH_PIXELS else MAX_BATCH_LARGE
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(pending), limit):
+            group = [(job, fut) for job, fut in pending[i:i + limit] if not fut.done()]
+            if not group:
+                continue
+            if len(group) > 1:
+                logger.info("coalesced %d txt2img requests at %dx%d", len(group), width, height)
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    functools.partial(
+                        self._generate_batch_sync,
+                        [job for job, _ in group],
+                        width=width,
+                        height=height,
+                        steps=steps,
+                        guidance_scale=guidance_scale,
+                    ),
+                )
+            except asyncio.CancelledError:
+                # The executor dropped the job (shutdown) or this task was
+                # cancelled; later groups won't run either, so nobody is left
+                # awaiting a future that will never resolve
+                for _, fut in pending[i:]:
+                    fut.cancel()
+                raise
+            except Exception as e:
+                for _, fut in group:
+                    if not fut.done():
+                        fut.set_exception(e)
+            else:
+                for (_, fut), result in zip(group, results):
+                    if not fut.done():
+                        fut.set_result(result)
+
+    def shutdown(self, wait: bool = False):
+        """Stop the flux worker, dropping queued jobs.
+
+        An in-flight generation can't be interrupted; by default it is left to
+        finish in the background instead of blocking shutdown on it.
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
 
     def _ensure_loaded(self):
         """Load the pipeline if not already in VRAM."""
@@ -149,117 +254,143 @@ class FluxClient:
         steps: int = FLUX_DEFAULT_STEPS,
         guidance_scale: float = FLUX_DEFAULT_GUIDANCE,
     ) -> Tuple[str, ImageInfo]:
-        """Synchronous generation (called via asyncio.to_thread).
+        """Synchronous single-image generation (called on the flux worker via _run_sync).
 
         Flux2 Klein uses the `image` arg as a reference/condition, not a noisy
         init, so there is no `strength` parameter — the pipeline decides how
         much the output diverges from the reference based on the prompt alone.
         """
+        return self._generate_batch_sync(
+            [{"prompt": prompt, "seed": seed}],
+            width=width,
+            height=height,
+            steps=steps,
+            guidance_scale=guidance_scale,
+            image=image,
+        )[0]
+
+    def _generate_batch_sync(
+        self,
+        jobs: List[dict],
+        width: int,
+        height: int,
+        steps: int,
+        guidance_scale: float,
+        image: Optional[Image.Image] = None,
+    ) -> List[Tuple[str, ImageInfo]]:
+        """Run one pipeline call for every {prompt, seed} job in `jobs`.
+
+        All jobs share the sampling params; each gets its own generator so a
+        batched image is identical to what the same seed gives on its own.
+        Returns one (file_path, ImageInfo) per job, in order.
+        """
         mode = "img2img" if image is not None else "txt2img"
         logger.info(
-            "generate_sync mode=%s requested %dx%d steps=%d guidance=%s seed=%s",
-            mode, width, height, steps, guidance_scale, seed,
+            "generate_sync mode=%s batch=%d requested %dx%d steps=%d guidance=%s seeds=%s",
+            mode, len(jobs), width, height, steps, guidance_scale, [j["seed"] for j in jobs],
         )
-        logger.debug("prompt: %s", prompt)
+        for job in jobs:
+            logger.debug("prompt: %s", job["prompt"])
 
         self._ensure_loaded()
 
         orig_w, orig_h = width, height
-        width = min(1536, max(256, width))
-        height = min(1536, max(256, height))
-        width = (width // 64) * 64
-        height = (height // 64) * 64
-        steps = min(20, max(1, steps))
+        width, height, steps = _clamp_params(width, height, steps)
         if (width, height) != (orig_w, orig_h):
             logger.info("clamped dims %dx%d -> %dx%d", orig_w, orig_h, width, height)
 
-        if seed >= 0:
-            generator = torch.Generator(device="cuda").manual_seed(seed)
-        else:
-            seed = int(torch.randint(0, 2**32, (1,)).item())
-            generator = torch.Generator(device="cuda").manual_seed(seed)
-            logger.info("seed was -1, randomized to %d", seed)
+        seeds = []
+        for job in jobs:
+            seed = job["seed"]
+            if seed < 0:
+                seed = int(torch.randint(0, 2**32, (1,)).item())
+                logger.info("seed was -1, randomized to %d", seed)
+            seeds.append(seed)
+        generators = [torch.Generator(device="cuda").manual_seed(s) for s in seeds]
+        prompts = [job["prompt"] for job in jobs]
 
         kwargs = {
-            "prompt": prompt,
+            "prompt": prompts[0] if len(jobs) == 1 else prompts,
             "height": height,
             "width": width,
             "num_inference_steps": steps,
             "guidance_scale": guidance_scale,
-            "generator": generator,
+            "generator": generators[0] if len(jobs) == 1 else generators,
         }
 
+        src_w = src_h = None
         if image is not None:
             src_w, src_h = image.size
             kwargs["image"] = image.convert("RGB").resize((width, height), Image.LANCZOS)
             logger.info("img2img source %dx%d resized to %dx%d", src_w, src_h, width, height)
 
         logger.info(
-            "pipeline call mode=%s %dx%d steps=%d guidance=%s seed=%d (%s)",
-            mode, width, height, steps, guidance_scale, seed, _vram_str(),
+            "pipeline call mode=%s batch=%d %dx%d steps=%d guidance=%s seeds=%s (%s)",
+            mode, len(jobs), width, height, steps, guidance_scale, seeds, _vram_str(),
         )
         start = time.perf_counter()
 
         result = self._pipe(**kwargs)
-        output_image = result.images[0]
 
         duration = time.perf_counter() - start
         logger.info("pipeline done in %.2fs", duration)
 
-        # Save to disk
-        timestamp = int(time.time() * 1000)
-        if image is not None:
-            save_dir = OUTPUT_DIR_I2I
-            filename = f"img2img-{timestamp}-0.png"
-        else:
-            save_dir = OUTPUT_DIR_T2I
-            filename = f"txt2img-{timestamp}-0.png"
-
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = os.path.join(save_dir, filename)
-
-        # Embed generation metadata in PNG text chunks so the params can be
-        # recovered later via PIL / exiftool / a1111-compatible tooling.
-        meta = PngInfo()
+        ensure_output_dirs()
         sampler = type(self._pipe.scheduler).__name__
-        # Stable Diffusion WebUI / civitai-compatible "parameters" block
-        params_block = (
-            f"{prompt}\n"
-            f"Steps: {steps}, Sampler: {sampler}, CFG scale: {guidance_scale}, "
-            f"Seed: {seed}, Size: {width}x{height}, "
-            f"Model: {FLUX_MODEL_ID}"
-        )
-        meta.add_text("parameters", params_block)
-        # Explicit machine-readable keys
-        meta.add_text("flux_prompt", prompt)
-        meta.add_text("flux_seed", str(seed))
-        meta.add_text("flux_steps", str(steps))
-        meta.add_text("flux_guidance_scale", str(guidance_scale))
-        meta.add_text("flux_width", str(width))
-        meta.add_text("flux_height", str(height))
-        meta.add_text("flux_sampler", sampler)
-        meta.add_text("flux_model", FLUX_MODEL_ID)
-        meta.add_text("flux_mode", "img2img" if image is not None else "txt2img")
-        meta.add_text("flux_duration_s", f"{duration:.3f}")
-        if image is not None:
-            meta.add_text("flux_source_size", f"{src_w}x{src_h}")
-
-        output_image.save(save_path, pnginfo=meta)
-        logger.info("saved %s", save_path)
-
-        info = ImageInfo(
-            sampler_name="Flux2Klein",
-            steps=steps,
-            cfg_scale=guidance_scale,
-            width=width,
-            height=height,
-            seed=seed,
-        )
+        timestamp = int(time.time() * 1000)
+        outputs = []
+        for i, (output_image, prompt, seed) in enumerate(zip(result.images, prompts, seeds)):
+            # Save to disk
+            save_dir = OUTPUT_DIR_I2I if image is not None else OUTPUT_DIR_T2I
+            index = i
+            save_path = os.path.join(save_dir, f"{mode}-{timestamp}-{index}.png")
+            # Back-to-back batches can land in the same millisecond
+            while os.path.exists(save_path):
+                index += 1
+                save_path = os.path.join(save_dir, f"{mode}-{timestamp}-{index}.png")
+
+            # Embed generation metadata in PNG text chunks so the params can be
+            # recovered later via PIL / exiftool / a1111-compatible tooling.
+            meta = PngInfo()
+            # Stable Diffusion WebUI / civitai-compatible "parameters" block
+            params_block = (
+                f"{prompt}\n"
+                f"Steps: {steps}, Sampler: {sampler}, CFG scale: {guidance_scale}, "
+                f"Seed: {seed}, Size: {width}x{height}, "
+                f"Model: {FLUX_MODEL_ID}"
+            )
+            meta.add_text("parameters", params_block)
+            # Explicit machine-readable keys
+            meta.add_text("flux_prompt", prompt)
+            meta.add_text("flux_seed", str(seed))
+            meta.add_text("flux_steps", str(steps))
+            meta.add_text("flux_guidance_scale", str(guidance_scale))
+            meta.add_text("flux_width", str(width))
+            meta.add_text("flux_height", str(height))
+            meta.add_text("flux_sampler", sampler)
+            meta.add_text("flux_model", FLUX_MODEL_ID)
+            meta.add_text("flux_mode", mode)
+            meta.add_text("flux_duration_s", f"{duration:.3f}")
+            if image is not None:
+                meta.add_text("flux_source_size", f"{src_w}x{src_h}")
+
+            output_image.save(save_path, pnginfo=meta)
+            logger.info("saved %s", save_path)
+
+            info = ImageInfo(
+                sampler_name="Flux2Klein",
+                steps=steps,
+                cfg_scale=guidance_scale,
+                width=width,
+                height=height,
+                seed=seed,
+            )
+            outputs.append((save_path, info))
 
         self._last_used = time.time()
         self._schedule_unload()
 
-        return save_path, info
+        return outputs
 
     async def generate(
         self,
@@ -277,8 +408,7 @@ class FluxClient:
         path = None
         info = None
         try:
-            path, info = await asyncio.to_thread(
-                self._generate_sync,
+            path, info = await self._submit_txt2img(
                 prompt=prompt,
                 seed=seed,
                 width=width,
@@ -327,8 +457,7 @@ class FluxClient:
         path = None
         info = None
         try:
-            path, info = await asyncio.to_thread(
-                self._generate_sync,
+            path, info = await self._run_sync(
                 prompt=prompt,
                 image=image,
                 seed=seed,
@@ -3,6 +3,7 @@
 Uses Flux2 Klein 9B for native text-to-image and image-to-image generation.
 """
 
+import asyncio
 import logging
 import re
 import time
@@ -154,6 +155,25 @@ class ImageGenerator:
         self.ollama_client = OllamaClient()
         self.flux_client = FluxClient()
 
+    async def _check_nsfw(self, file_path: str) -> bool:
+        """Classify a generated image as NSFW or not.
+
+        The downsize + base64 encode decodes and resamples the full image, so
+        it runs on a worker thread rather than blocking the event loop.
+        """
+        # Downsampled to keep vision token count small
+        t1 = time.perf_counter()
+        image_base64 = await asyncio.to_thread(
+            encode_image_downsized_to_base64, file_path, max_side=512,
+        )
+        logger.info("nsfw check: downsized base64 len=%d bytes", len(image_base64))
+        is_nsfw = await self.ollama_client.classify_nsfw([image_base64])
+        logger.info(
+            "nsfw classification done in %.2fs: %s",
+            time.perf_counter() - t1, "NSFW" if is_nsfw else "SFW",
+        )
+        return is_nsfw
+
     async def generate_image(
         self,
         prompt: str,
@@ -185,16 +205,7 @@ class ImageGenerator:
         )
         logger.info("flux gen done in %.2fs -> %s", time.perf_counter() - t0, file_path)
 
-        # NSFW check (downsampled to keep vision token count small)
-        t1 = time.perf_counter()
-        image_base64 = encode_image_downsized_to_base64(file_path, max_side=512)
-        logger.info("nsfw check: downsized base64 len=%d bytes", len(image_base64))
-        is_nsfw = await self.ollama_client.classify_nsfw([image_base64])
-        logger.info(
-            "nsfw classification done in %.2fs: %s",
-            time.perf_counter() - t1, "NSFW" if is_nsfw else "SFW",
-        )
-
+        is_nsfw = await self._check_nsfw(file_path)
         return file_path, image_info, is_nsfw
 
     async def edit_image(
@@ -219,7 +230,9 @@ class ImageGenerator:
             "edit_image source=%s seed=%s %dx%d steps=%d cfg=%s prompt_len=%d",
             image_path, seed, width, height, steps, cfg_scale, len(prompt),
         )
-        source_image = Image.open(image_path).convert("RGB")
+        source_image = await asyncio.to_thread(
+            lambda: Image.open(image_path).convert("RGB")
+        )
         logger.debug("source image opened: %dx%d mode=%s",
                      *source_image.size, source_image.mode)
 
@@ -235,16 +248,7 @@ class ImageGenerator:
         )
         logger.info("flux edit done in %.2fs -> %s", time.perf_counter() - t0, file_path)
 
-        # NSFW check (downsampled to keep vision token count small)
-        t1 = time.perf_counter()
-        image_base64 = encode_image_downsized_to_base64(file_path, max_side=512)
-        logger.info("nsfw check: downsized base64 len=%d bytes", len(image_base64))
-        is_nsfw = await self.ollama_client.classify_nsfw([image_base64])
-        logger.info(
-            "nsfw classification done in %.2fs: %s",
-            time.perf_counter() - t1, "NSFW" if is_nsfw else "SFW",
-        )
-
+        is_nsfw = await self._check_nsfw(file_path)
         return file_path, image_info, is_nsfw
 
     async def is_image_generation_task(self, prompt: str) -> bool:
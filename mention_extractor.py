@@ -25,6 +25,8 @@ USER_MENTION_PATTERN = re.compile(r'<@!?(\d+)>')
 CHANNEL_MENTION_PATTERN = re.compile(r'<#(\d+)>')
 # Role mention: <@&ROLE_ID>
 ROLE_MENTION_PATTERN = re.compile(r'<@&(\d+)>')
+# All three in one alternation, so a full scan walks the text once
+MENTION_PATTERN = re.compile(r'<(?:@!?(?P<users>\d+)|#(?P<channels>\d+)|@&(?P<roles>\d+))>')
 
 
 def extract_user_ids(text: str) -> List[str]:
@@ -52,11 +54,10 @@ def extract_all_mentions(text: str) -> Dict[str, List[str]]:
     Returns:
         Dictionary with 'users', 'channels', and 'roles' keys containing lists of IDs
     """
-    return {
-        'users': extract_user_ids(text),
-        'channels': extract_channel_ids(text),
-        'roles': extract_role_ids(text)
-    }
+    mentions = {'users': [], 'channels': [], 'roles': []}
+    for match in MENTION_PATTERN.finditer(text):
+        mentions[match.lastgroup].append(match.group(match.lastgroup))
+    return mentions
 
 
 def resolve_mentions(
@@ -73,37 +74,48 @@ def resolve_mentions(
     Returns:
         ExtractedMentions with resolved user, channel, and role information
     """
-    users = []
-    channels = []
-    roles = []
+    # Every mention form starts with '<'; most messages have none
+    if '<' not in text:
+        return ExtractedMentions(users=[], channels=[], roles=[])
+
+    mention_ids = extract_all_mentions(text)
+    # Resolve each distinct ID once; repeat mentions (common in replies)
+    # reuse the lookup. Output keeps one entry per occurrence.
+    resolved_users: Dict[str, Dict[str, str]] = {}
+    resolved_channels: Dict[str, Dict[str, str]] = {}
+    resolved_roles: Dict[str, Dict[str, str]] = {}
 
     # Extract user mentions
-    for user_id in extract_user_ids(text):
+    for user_id in dict.fromkeys(mention_ids['users']):
         user_info = {"id": user_id, "display_name": f"User#{user_id}"}
         if guild:
             member = guild.get_member(int(user_id))
             if member:
                 user_info["display_name"] = member.display_name
                 user_info["username"] = member.name
-        users.append(user_info)
+        resolved_users[user_id] = user_info
 
     # Extract channel mentions
-    for channel_id in extract_channel_ids(text):
+    for channel_id in dict.fromkeys(mention_ids['channels']):
         channel_info = {"id": channel_id, "name": f"channel-{channel_id}"}
         if guild:
             channel = guild.get_channel(int(channel_id))
             if channel:
                 channel_info["name"] = channel.name
-        channels.append(channel_info)
+        resolved_channels[channel_id] = channel_info
 
     # Extract role mentions
-    for role_id in extract_role_ids(text):
+    for role_id in dict.fromkeys(mention_ids['roles']):
         role_info = {"id": role_id, "name": f"Role#{role_id}"}
         if guild:
             role = guild.get_role(int(role_id))
             if role:
                 role_info["name"] = role.name
-        roles.append(role_info)
+        resolved_roles[role_id] = role_info
+
+    users = [dict(resolved_users[uid]) for uid in mention_ids['users']]
+    channels = [dict(resolved_channels[cid]) for cid in mention_ids['channels']]
+    roles = [dict(resolved_roles[rid]) for rid in mention_ids['roles']]
 
     return ExtractedMentions(users=users, channels=channels, roles=roles)
 
@@ -160,5 +172,7 @@ def extract_mention_context(text: str, guild: Optional[discord.Guild] = None) ->
     Returns:
         Formatted string with mention context, or empty string if no mentions
     """
+    if '<' not in text:
+        return ""
     mentions = resolve_mentions(text, guild)
     return format_mentions_context(mentions)
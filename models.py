@@ -2,6 +2,7 @@
 
 from dataclasses import dataclass
 from enum import Enum
+from typing import Optional
 
 
 class Txt2ImgModel(Enum):
@@ -32,15 +33,32 @@ class Txt2TxtModel(Enum):
     CLAUDE_CODE_QWEN35 = "cc-qwen3.5:35b-a3b-q8_0"
 
 
+# Plain name -> model string maps, so lookups skip the Enum machinery
+TXT2IMG_VALUES: dict[str, str] = {m.name: m.value for m in Txt2ImgModel}
+TXT2TXT_VALUES: dict[str, str] = {m.name: m.value for m in Txt2TxtModel}
+
+# Lowercased enum name or model string -> member, for user-typed model names
+_TXT2TXT_BY_KEY: dict[str, Txt2TxtModel] = {}
+for _m in Txt2TxtModel:
+    _TXT2TXT_BY_KEY[_m.name.lower()] = _m
+    _TXT2TXT_BY_KEY.setdefault(_m.value.lower(), _m)
+del _m
+
+
 # All models that route through the Claude Code CLI (Anthropic or Ollama-backed)
 CLAUDE_CODE_MODELS = {
-    Txt2TxtModel.CLAUDE_CODE.value,
-    Txt2TxtModel.CLAUDE_CODE_OPUS.value,
-    Txt2TxtModel.CLAUDE_CODE_QWEN35.value,
+    TXT2TXT_VALUES["CLAUDE_CODE"],
+    TXT2TXT_VALUES["CLAUDE_CODE_OPUS"],
+    TXT2TXT_VALUES["CLAUDE_CODE_QWEN35"],
 }
 
 # Models that are Anthropic Claude (for response splitting, search behavior)
-_ANTHROPIC_MODELS = {Txt2TxtModel.CLAUDE_CODE.value, Txt2TxtModel.CLAUDE_CODE_OPUS.value}
+_ANTHROPIC_MODELS = {TXT2TXT_VALUES["CLAUDE_CODE"], TXT2TXT_VALUES["CLAUDE_CODE_OPUS"]}
+
+
+def find_txt2txt_model(key: str) -> Optional[Txt2TxtModel]:
+    """Match a model by enum name or model string, case-insensitively."""
+    return _TXT2TXT_BY_KEY.get(key.lower())
 
 
 def is_claude_code_model(model_value: str) -> bool:
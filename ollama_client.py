@@ -1,15 +1,29 @@
 """Ollama API client for Discord LLM Bot"""
 
+import json
 import logging
-import traceback
+import re
 import time
-from typing import List, Optional
-from aiohttp import ClientSession, ClientTimeout
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 
 # Ollama model cold-loads + vision inference on big images can easily exceed
 # aiohttp's 5-minute default. 20 minutes is more than enough headroom.
 _OLLAMA_TIMEOUT = ClientTimeout(total=1200, sock_read=1200, sock_connect=30)
 
+# Yes/No classifier verdicts are a pure function of the prompt, so repeated
+# inputs (retries, copy-pasted messages, preload warmups) reuse the answer
+# instead of paying another Ollama round-trip.
+_CLASSIFIER_CACHE_SIZE = 512
+
+# Minimum seconds between on_chunk callbacks while streaming. Every
+# consumer (early ---MSG--- delivery, /ask progressive edits) works on the
+# accumulated text, so the reader batches tokens rather than re-joining and
+# handing over the whole response per token; this also keeps /ask edits
+# well under Discord's message-edit rate limit.
+STREAM_CALLBACK_INTERVAL = 0.5
+
 from config import (
     OLLAMA_API_URL,
     CHAT_MODEL,
@@ -29,6 +43,35 @@ def _truncate(s: str, n: int = 160) -> str:
     return s if len(s) <= n else s[:n] + f"...[+{len(s)-n} chars]"
 
 
+# Classifier verdict words. Matched on word boundaries: a bare substring test
+# also fires on "eyes", "yesterday", "unsfw..." in chatty or thinking output.
+_YES_RE = re.compile(r'\byes\b', re.IGNORECASE)
+_NSFW_RE = re.compile(r'\bnsfw\b', re.IGNORECASE)
+
+# Patterns used by _sanitize_prompt_output, compiled once at import
+_OPTION_ONE_RE = re.compile(
+    r'(?:^|\n)\s*(?:\*\*)?Option\s*1[^\n:]*:?\s*(?:\*\*)?\s*\n+(.+?)'
+    r'(?=\n\s*(?:\*\*)?Option\s*2|\Z)',
+    re.DOTALL | re.IGNORECASE,
+)
+_FENCE_RE = re.compile(r'^```[a-zA-Z]*\n?(.+?)\n?```\s*$', re.DOTALL)
+_PREAMBLE_RE = re.compile(
+    r"^(okay|ok|sure|here('?s| is)[^:\n]*:|let me[^:\n]*:|prompt:|alright[^:\n]*:|based on[^:\n]*:)",
+    re.IGNORECASE,
+)
+# One alternation: the leftmost hit of any follow-up opener is where the
+# prompt ends, found in a single scan instead of one search per phrase
+_FOLLOWUP_CUTOFF_RE = re.compile(
+    r'\n\s*(?:To help me refine|To refine|Let me know if|Do you want|Would you like'
+    r'|Please tell me|\*\s*What|Hope this helps)',
+    re.IGNORECASE,
+)
+_WHITESPACE_RUN_RE = re.compile(r'\s+')
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+_ITALIC_RE = re.compile(r'(?<!\w)\*(.+?)\*(?!\w)')
+_UNDERLINE_RE = re.compile(r'__(.+?)__')
+
+
 def _sanitize_prompt_output(raw: str) -> str:
     """Clean up a chat model's response that was supposed to be a single
     image-generation prompt.
@@ -41,65 +84,181 @@ def _sanitize_prompt_output(raw: str) -> str:
     - Follow-up question blocks at the end
     - Trailing commentary
     """
-    import re
     text = raw.strip()
     if not text:
         return text
 
     # If the model emitted multiple options, grab the first one's content.
     # Look for "Option N" or "Option N:" headers.
-    option_match = re.search(
-        r'(?:^|\n)\s*(?:\*\*)?Option\s*1[^\n:]*:?\s*(?:\*\*)?\s*\n+(.+?)'
-        r'(?=\n\s*(?:\*\*)?Option\s*2|\Z)',
-        text, re.DOTALL | re.IGNORECASE,
-    )
+    option_match = _OPTION_ONE_RE.search(text)
     if option_match:
         text = option_match.group(1).strip()
 
     # Strip code fences if the whole thing is wrapped
-    fence = re.match(r'^```[a-zA-Z]*\n?(.+?)\n?```\s*$', text, re.DOTALL)
+    fence = _FENCE_RE.match(text)
     if fence:
         text = fence.group(1).strip()
 
     # Drop preamble lines like "Here is the prompt:", "Okay, ..."
-    preamble_patterns = [
-        r"^(okay|ok|sure|here('?s| is)[^:\n]*:|let me[^:\n]*:|prompt:|alright[^:\n]*:|based on[^:\n]*:)",
-    ]
-    for pat in preamble_patterns:
-        text = re.sub(pat, "", text, count=1, flags=re.IGNORECASE).lstrip(":").strip()
+    text = _PREAMBLE_RE.sub("", text, count=1).lstrip(":").strip()
 
     # Strip surrounding quotes
     if len(text) >= 2 and text[0] in '"\u201c\u2018' and text[-1] in '"\u201d\u2019':
         text = text[1:-1].strip()
 
     # Drop trailing "To refine the prompt further, please tell me..." follow-up blocks
-    cutoffs = [
-        r'\n\s*To help me refine', r'\n\s*To refine', r'\n\s*Let me know if',
-        r'\n\s*Do you want', r'\n\s*Would you like', r'\n\s*Please tell me',
-        r'\n\s*\*\s*What', r'\n\s*Hope this helps',
-    ]
-    for pat in cutoffs:
-        m = re.search(pat, text, re.IGNORECASE)
-        if m:
-            text = text[:m.start()].rstrip()
+    m = _FOLLOWUP_CUTOFF_RE.search(text)
+    if m:
+        text = text[:m.start()].rstrip()
 
     # Collapse repeated whitespace / newlines into single spaces since we want
     # one paragraph for a diffusion prompt
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _WHITESPACE_RUN_RE.sub(' ', text).strip()
 
     # Strip remaining markdown emphasis markers
-    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)
-    text = re.sub(r'(?<!\w)\*(.+?)\*(?!\w)', r'\1', text)
-    text = re.sub(r'__(.+?)__', r'\1', text)
+    text = _BOLD_RE.sub(r'\1', text)
+    text = _ITALIC_RE.sub(r'\1', text)
+    text = _UNDERLINE_RE.sub(r'\1', text)
 
     return text.strip()
 
 
+# Classifier / extractor system prompts. The "System: ...\nUser: " prefix
+# around each is built once here instead of re-formatted on every call.
+_ASSISTANT_SUFFIX = "\nAssistant: "
+
+# Yes/No classifiers only need the first word of the answer: cap generation
+# and sample greedily so the verdict is deterministic and returns after a
+# couple of tokens instead of whatever tail the model wants to add
+_VERDICT_NUM_PREDICT = 4
+_VERDICT_OPTIONS = {"temperature": 0}
+
+_IMAGE_TASK_SYSTEM = (
+    "You are a classifier. Decide whether the user's message is a request to "
+    "generate a new image OR to modify / edit an existing image. "
+    "Your response must be exactly 'Yes' or 'No', nothing else.\n\n"
+    "Return 'Yes' for:\n"
+    "- Direct generation requests: 'generate an image of a cat', 'draw me a dragon', "
+    "'create a picture of a sunset', 'make me a photo of...', 'paint a portrait of...'\n"
+    "- Edit/modification requests when the prompt contains either:\n"
+    "    * a '[Previous: [Generated an image...]]' marker (follow-up on a bot image), OR\n"
+    "    * a '[User attached an image]' marker (editing a freshly uploaded image)\n"
+    "  In those cases, almost any natural-language visual instruction is an edit request:\n"
+    "    'make her hair green'\n"
+    "    'change the background to a beach'\n"
+    "    'add a hat'\n"
+    "    'remove the cat'\n"
+    "    'make it nighttime'\n"
+    "    'higher quality'\n"
+    "    'portrait version'\n"
+    "    'zoom in on the face'\n"
+    "    'turn this into an oil painting'\n"
+    "    'make him a cowboy'\n"
+    "\n"
+    "Return 'No' for:\n"
+    "- Questions ABOUT an existing image ('what is in this image?', 'who is that?', "
+    "'describe this', 'is this real?', 'do i look cute')\n"
+    "- Normal conversation unrelated to the image\n"
+    "- Requests for information, advice, search, or code\n"
+    "- Refusals or 'nevermind' messages\n"
+    "\n"
+    "If the message contains a marker AND the user's text describes a visual change, "
+    "the answer is Yes. If the user is only asking a question about the image, it is No."
+)
+_IMAGE_TASK_PREFIX = f"System: {_IMAGE_TASK_SYSTEM}\nUser: "
+
+_SEARCH_TASK_SYSTEM = (
+    "You are a classifier that determines whether a user's message requires searching the web for up-to-date information. "
+    "Your response should only contain two possible outcomes: Yes and No. "
+    "Output Yes if the message asks about current events, recent news, live data (weather, stocks, scores), "
+    "or anything that requires information newer than your training data. "
+    "Output No if the message is casual conversation, asks about general knowledge, or doesn't need fresh data. "
+    "Examples:\n"
+    "'what's the latest news about AI' -> Yes\n"
+    "'who won the super bowl this year' -> Yes\n"
+    "'what's the weather in new york' -> Yes\n"
+    "'how does photosynthesis work' -> No\n"
+    "'hey what's up' -> No\n"
+    "'tell me a joke' -> No"
+)
+_SEARCH_TASK_PREFIX = f"System: {_SEARCH_TASK_SYSTEM}\nUser: "
+
+_SEARCH_QUERY_SYSTEM = (
+    "You are a tool that extracts a concise web search query from a user's message. "
+    "Output ONLY the search query, nothing else. No quotes, no explanation. "
+    "Examples:\n"
+    "User: 'hey do you know what's going on with the AI regulations in the EU'\n"
+    "AI regulations EU 2026\n"
+    "User: 'who won the NBA finals'\n"
+    "NBA finals winner 2026\n"
+    "User: 'what's the current price of bitcoin'\n"
+    "bitcoin price today"
+)
+_SEARCH_QUERY_PREFIX = f"System: {_SEARCH_QUERY_SYSTEM}\nUser: "
+
+_NSFW_SYSTEM = (
+    "You are a strict binary classifier for Discord bot image filtering. "
+    "Output EXACTLY one word: NSFW or SFW.\n\n"
+    "NSFW (flag as NSFW) means the image contains any of:\n"
+    "- Exposed genitals, buttocks, or female nipples / areola\n"
+    "- Sexual acts, sexual poses, or explicit sexual imagery\n"
+    "- Sheer/see-through clothing that exposes the above\n"
+    "- Graphic violence, gore, or blood\n\n"
+    "SFW (safe for work) means everything else. In particular, "
+    "the following are SFW:\n"
+    "- Swimsuits, bikinis, tank tops, crop tops, lingerie worn in a "
+    "non-sexual context\n"
+    "- Bare shoulders, arms, legs, midriff, cleavage\n"
+    "- Suggestive poses that don't expose the NSFW areas above\n"
+    "- Anime/cartoon characters unless they match the NSFW criteria\n"
+    "- Artistic nudity is still NSFW if genitals or nipples are visible\n\n"
+    "Err on the side of SFW for borderline cases. Only output NSFW "
+    "when the image clearly matches the criteria above."
+)
+_NSFW_PROMPT = f"System: {_NSFW_SYSTEM}\nUser: Classify this image:\nAssistant:"
+
+
 class OllamaClient:
     """Client for interacting with Ollama API"""
 
     def __init__(self):
         self.api_url = OLLAMA_API_URL
+        self._classifier_cache: "OrderedDict[tuple, bool]" = OrderedDict()
+        # One pooled session for every call: all requests go to the same
+        # Ollama host, so keep-alive sockets are reused instead of paying
+        # connection setup per generate/classify call
+        self._session: Optional[ClientSession] = None
+
+    async def _get_session(self) -> ClientSession:
+        """Return the shared session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                timeout=_OLLAMA_TIMEOUT,
+                connector=TCPConnector(limit=32, limit_per_host=8, keepalive_timeout=75),
+            )
+        return self._session
+
+    async def close(self):
+        """Close the shared session (call on shutdown)."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _cached_verdict(self, kind: str, prompt: str) -> Optional[bool]:
+        """Return a cached classifier verdict, or None on a miss."""
+        key = (kind, prompt)
+        verdict = self._classifier_cache.get(key)
+        if verdict is not None:
+            self._classifier_cache.move_to_end(key)
+            logger.debug("classifier cache hit kind=%s verdict=%s", kind, verdict)
+        return verdict
+
+    def _store_verdict(self, kind: str, prompt: str, verdict: bool) -> bool:
+        """Remember a classifier verdict, evicting the least recently used."""
+        self._classifier_cache[(kind, prompt)] = verdict
+        if len(self._classifier_cache) > _CLASSIFIER_CACHE_SIZE:
+            self._classifier_cache.popitem(last=False)
+        return verdict
 
     async def generate(
         self,
@@ -110,6 +269,8 @@ class OllamaClient:
         num_ctx: Optional[int] = None,
         num_predict: Optional[int] = None,
         think: Optional[bool] = None,
+        on_chunk: Optional[Callable[[str], Awaitable[None]]] = None,
+        options: Optional[dict] = None,
     ) -> str:
         """Generate a response from Ollama.
 
@@ -126,6 +287,13 @@ class OllamaClient:
                    qwen3-vl). Set to False when you want fast, direct output
                    without hidden chain-of-thought tokens eating num_predict
                    budget.
+            on_chunk: Optional async callback. When set, the request is
+                      streamed and the callback receives the accumulated
+                      response text, at most every STREAM_CALLBACK_INTERVAL
+                      seconds and once more with the complete text. The
+                      full text is still returned at the end.
+            options: Extra Ollama sampling options (e.g. temperature), merged
+                     with num_ctx/num_predict.
         """
         n_images = len(images) if images else 0
         logger.info(
@@ -142,7 +310,7 @@ class OllamaClient:
             payload = {
                 "model": model,
                 "prompt": prompt,
-                "stream": False,
+                "stream": on_chunk is not None,
             }
 
             if keep_alive is not None:
@@ -150,7 +318,7 @@ class OllamaClient:
             if think is not None:
                 payload["think"] = think
 
-            options = {}
+            options = dict(options) if options else {}
             if num_ctx is not None:
                 options["num_ctx"] = num_ctx
             if num_predict is not None:
@@ -161,23 +329,26 @@ class OllamaClient:
             if images:
                 payload["images"] = images
 
-            async with ClientSession(timeout=_OLLAMA_TIMEOUT) as session:
-                async with session.post(self.api_url, json=payload) as resp:
+            session = await self._get_session()
+            async with session.post(self.api_url, json=payload) as resp:
+                if on_chunk is None:
                     data = await resp.json()
-                    if resp.status >= 400 or "error" in data:
-                        err = data.get("error") or f"HTTP {resp.status}"
-                        err_msg = f"Ollama API error ({model}): {err}"
-                        logger.error("api error model=%s status=%s error=%s",
-                                     model, resp.status, err)
-                        raise RuntimeError(err_msg)
-                    if "response" not in data:
-                        err_msg = f"Ollama returned no 'response' field for {model}: {data}"
-                        logger.error("missing response field model=%s body=%s",
-                                     model, _truncate(str(data), 300))
-                        raise RuntimeError(err_msg)
-                    response = data["response"]
-                    eval_count = data.get("eval_count")
-                    prompt_eval_count = data.get("prompt_eval_count")
+                else:
+                    data = await self._read_stream(resp, on_chunk)
+                if resp.status >= 400 or "error" in data:
+                    err = data.get("error") or f"HTTP {resp.status}"
+                    err_msg = f"Ollama API error ({model}): {err}"
+                    logger.error("api error model=%s status=%s error=%s",
+                                 model, resp.status, err)
+                    raise RuntimeError(err_msg)
+                if "response" not in data:
+                    err_msg = f"Ollama returned no 'response' field for {model}: {data}"
+                    logger.error("missing response field model=%s body=%s",
+                                 model, _truncate(str(data), 300))
+                    raise RuntimeError(err_msg)
+                response = data["response"]
+                eval_count = data.get("eval_count")
+                prompt_eval_count = data.get("prompt_eval_count")
 
             duration = time.perf_counter() - start_time
             logger.info(
@@ -189,8 +360,7 @@ class OllamaClient:
             return response
         except Exception as e:
             err_msg = err_msg or f"{type(e).__name__}: {e}"
-            logger.error("exception in generate model=%s: %s", model, e)
-            logger.debug("traceback:\n%s", traceback.format_exc())
+            logger.exception("exception in generate model=%s: %s", model, e)
             raise
         finally:
             duration = time.perf_counter() - start_time
@@ -214,48 +384,58 @@ class OllamaClient:
             except Exception as tel_err:
                 logger.debug("telemetry record failed: %s", tel_err)
 
+    @staticmethod
+    async def _read_stream(resp, on_chunk: Callable[[str], Awaitable[None]]) -> dict:
+        """Consume an NDJSON streaming response.
+
+        Returns the final chunk (which carries eval counts) with its
+        'response' replaced by the full accumulated text, or the error
+        body so generate() can report it the same way as a non-streamed call.
+        """
+        if resp.status >= 400:
+            return await resp.json(content_type=None)
+        text = ""
+        pending = []  # pieces received since text was last materialized
+        last_callback = time.perf_counter()
+        final = {}
+        async for line in resp.content:
+            line = line.strip()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                return chunk
+            piece = chunk.get("response")
+            if piece:
+                pending.append(piece)
+                now = time.perf_counter()
+                if now - last_callback >= STREAM_CALLBACK_INTERVAL:
+                    text += "".join(pending)
+                    pending.clear()
+                    last_callback = now
+                    await on_chunk(text)
+            if chunk.get("done"):
+                final = chunk
+                break
+        if pending:
+            text += "".join(pending)
+            await on_chunk(text)
+        return {**final, "response": text}
+
     async def classify_image_task(self, prompt: str) -> bool:
         """Check if a prompt is requesting image generation OR an edit of
         either a previously generated bot image or a user-attached image."""
-        system_prompt = (
-            "You are a classifier. Decide whether the user's message is a request to "
-            "generate a new image OR to modify / edit an existing image. "
-            "Your response must be exactly 'Yes' or 'No', nothing else.\n\n"
-            "Return 'Yes' for:\n"
-            "- Direct generation requests: 'generate an image of a cat', 'draw me a dragon', "
-            "'create a picture of a sunset', 'make me a photo of...', 'paint a portrait of...'\n"
-            "- Edit/modification requests when the prompt contains either:\n"
-            "    * a '[Previous: [Generated an image...]]' marker (follow-up on a bot image), OR\n"
-            "    * a '[User attached an image]' marker (editing a freshly uploaded image)\n"
-            "  In those cases, almost any natural-language visual instruction is an edit request:\n"
-            "    'make her hair green'\n"
-            "    'change the background to a beach'\n"
-            "    'add a hat'\n"
-            "    'remove the cat'\n"
-            "    'make it nighttime'\n"
-            "    'higher quality'\n"
-            "    'portrait version'\n"
-            "    'zoom in on the face'\n"
-            "    'turn this into an oil painting'\n"
-            "    'make him a cowboy'\n"
-            "\n"
-            "Return 'No' for:\n"
-            "- Questions ABOUT an existing image ('what is in this image?', 'who is that?', "
-            "'describe this', 'is this real?', 'do i look cute')\n"
-            "- Normal conversation unrelated to the image\n"
-            "- Requests for information, advice, search, or code\n"
-            "- Refusals or 'nevermind' messages\n"
-            "\n"
-            "If the message contains a marker AND the user's text describes a visual change, "
-            "the answer is Yes. If the user is only asking a question about the image, it is No."
-        )
+        cached = self._cached_verdict("image", prompt)
+        if cached is not None:
+            return cached
 
-        full_prompt = f"System: {system_prompt}\nUser: {prompt}\nAssistant: "
+        full_prompt = _IMAGE_TASK_PREFIX + prompt + _ASSISTANT_SUFFIX
         response = await self.generate(
             full_prompt, model=CHAT_MODEL, keep_alive=-1, num_ctx=4096, think=False,
+            num_predict=_VERDICT_NUM_PREDICT, options=_VERDICT_OPTIONS,
         )
 
-        return "yes" in response.lower()
+        return self._store_verdict("image", prompt, bool(_YES_RE.search(response)))
 
     async def generate_image_prompt(self, prompt: str) -> str:
         """Generate an image generation prompt from user input"""
@@ -473,40 +653,20 @@ class OllamaClient:
 
     async def classify_search_task(self, prompt: str) -> bool:
         """Check if a prompt requires up-to-date information from the web"""
-        system_prompt = (
-            "You are a classifier that determines whether a user's message requires searching the web for up-to-date information. "
-            "Your response should only contain two possible outcomes: Yes and No. "
-            "Output Yes if the message asks about current events, recent news, live data (weather, stocks, scores), "
-            "or anything that requires information newer than your training data. "
-            "Output No if the message is casual conversation, asks about general knowledge, or doesn't need fresh data. "
-            "Examples:\n"
-            "'what's the latest news about AI' -> Yes\n"
-            "'who won the super bowl this year' -> Yes\n"
-            "'what's the weather in new york' -> Yes\n"
-            "'how does photosynthesis work' -> No\n"
-            "'hey what's up' -> No\n"
-            "'tell me a joke' -> No"
-        )
+        cached = self._cached_verdict("search", prompt)
+        if cached is not None:
+            return cached
 
-        full_prompt = f"System: {system_prompt}\nUser: {prompt}\nAssistant: "
-        response = await self.generate(full_prompt, model=SEARCH_UTILITY_MODEL)
-        return "yes" in response.lower()
+        full_prompt = _SEARCH_TASK_PREFIX + prompt + _ASSISTANT_SUFFIX
+        response = await self.generate(
+            full_prompt, model=SEARCH_UTILITY_MODEL,
+            num_predict=_VERDICT_NUM_PREDICT, options=_VERDICT_OPTIONS,
+        )
+        return self._store_verdict("search", prompt, bool(_YES_RE.search(response)))
 
     async def extract_search_query(self, prompt: str) -> str:
         """Extract a concise search query from a user's message"""
-        system_prompt = (
-            "You are a tool that extracts a concise web search query from a user's message. "
-            "Output ONLY the search query, nothing else. No quotes, no explanation. "
-            "Examples:\n"
-            "User: 'hey do you know what's going on with the AI regulations in the EU'\n"
-            "AI regulations EU 2026\n"
-            "User: 'who won the NBA finals'\n"
-            "NBA finals winner 2026\n"
-            "User: 'what's the current price of bitcoin'\n"
-            "bitcoin price today"
-        )
-
-        full_prompt = f"System: {system_prompt}\nUser: {prompt}\nAssistant: "
+        full_prompt = _SEARCH_QUERY_PREFIX + prompt + _ASSISTANT_SUFFIX
         response = await self.generate(full_prompt, model=SEARCH_UTILITY_MODEL)
         return response.strip()
 
@@ -527,37 +687,41 @@ class OllamaClient:
         )
         return await self.generate(full_prompt, model=SEARCH_SUMMARIZATION_MODEL)
 
-    async def classify_nsfw(self, images: List[str]) -> bool:
-        """Classify if an image is NSFW"""
+    async def summarize_conversation(self, previous_summary: str, transcript: str) -> str:
+        """Fold older conversation turns into a rolling summary.
+
+        Used for messages that have scrolled out of the channel's context
+        window, so the chat prompt keeps a compact memory of them instead of
+        the full text.
+        """
         system_prompt = (
-            "You are a strict binary classifier for Discord bot image filtering. "
-            "Output EXACTLY one word: NSFW or SFW.\n\n"
-            "NSFW (flag as NSFW) means the image contains any of:\n"
-            "- Exposed genitals, buttocks, or female nipples / areola\n"
-            "- Sexual acts, sexual poses, or explicit sexual imagery\n"
-            "- Sheer/see-through clothing that exposes the above\n"
-            "- Graphic violence, gore, or blood\n\n"
-            "SFW (safe for work) means everything else. In particular, "
-            "the following are SFW:\n"
-            "- Swimsuits, bikinis, tank tops, crop tops, lingerie worn in a "
-            "non-sexual context\n"
-            "- Bare shoulders, arms, legs, midriff, cleavage\n"
-            "- Suggestive poses that don't expose the NSFW areas above\n"
-            "- Anime/cartoon characters unless they match the NSFW criteria\n"
-            "- Artistic nudity is still NSFW if genitals or nipples are visible\n\n"
-            "Err on the side of SFW for borderline cases. Only output NSFW "
-            "when the image clearly matches the criteria above."
+            "You maintain a running summary of a Discord conversation. "
+            "Merge the new messages into the existing summary. Keep who said "
+            "what, decisions, open questions, and any facts users shared about "
+            "themselves. Drop greetings and filler. Output ONLY the updated "
+            "summary as a few short sentences, no preamble, no markdown."
         )
+        full_prompt = (
+            f"System: {system_prompt}\n\n"
+            f"Existing summary: {previous_summary or '(none)'}\n\n"
+            f"New messages:\n{transcript}\n\n"
+            f"Updated summary:"
+        )
+        raw = await self.generate(
+            full_prompt, model=CHAT_MODEL, keep_alive=-1,
+            num_ctx=8192, num_predict=300, think=False,
+        )
+        return raw.strip()
 
-        user_prompt = "Classify this image:"
-        full_prompt = f"System: {system_prompt}\nUser: {user_prompt}\nAssistant:"
-
+    async def classify_nsfw(self, images: List[str]) -> bool:
+        """Classify if an image is NSFW"""
         response = await self.generate(
-            full_prompt,
+            _NSFW_PROMPT,
             model=NSFW_CLASSIFICATION_MODEL,
             images=images,
             num_ctx=4096,
             num_predict=32,  # "NSFW"/"SFW" is 1-2 tokens; 32 gives headroom
             keep_alive=-1,
+            options=_VERDICT_OPTIONS,
         )
-        return "nsfw" in response.lower()
+        return bool(_NSFW_RE.search(response))
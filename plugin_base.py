@@ -44,13 +44,13 @@ class PluginBotContext:
 
     # --- Safe write access ---
 
-    def append_to_context(self, server: int, channel: int, entry: dict):
-        """Add an entry to conversation context."""
-        if server not in self._bot.context:
-            self._bot.context[server] = {}
-        if channel not in self._bot.context[server]:
-            self._bot.context[server][channel] = []
-        self._bot.context[server][channel].append(entry)
+    async def append_to_context(self, server: int, channel: int, entry: dict):
+        """Add an entry to conversation context.
+
+        Goes through the bot's own append, so anchors are kept, evictions
+        feed the channel summary and the entry is persisted.
+        """
+        await self._bot.append_context(server, channel, entry)
 
     async def query_llm(self, prompt: str, model: str = None, images: list = None) -> str:
         """Query the LLM through the bot's existing clients."""
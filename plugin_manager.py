@@ -37,6 +37,12 @@ class PluginManager:
         self._disabled: set = set()
         self._hooks: Dict[HookType, List[tuple]] = {h: [] for h in HookType}
         self._pending_sync = False
+        # Per-message dispatch tables, rebuilt lazily after load/unload/disable
+        self._handler_table: Optional[List[tuple]] = None
+        self._suppress_providers: Optional[List[tuple]] = None
+        self._override_providers: Optional[List[tuple]] = None
+        # Bumped whenever the plugin set or a plugin's status changes
+        self.version = 0
 
     # ── Discovery ──────────────────────────────────────────────────────
 
@@ -144,6 +150,7 @@ class PluginManager:
         self._disabled.discard(name)
         self._register_commands(instance)
         self._register_hooks(instance)
+        self._invalidate_dispatch_tables()
         logger.info(f"Loaded plugin: {name} v{instance.version}")
         return True, None
 
@@ -165,6 +172,7 @@ class PluginManager:
         del self._plugins[name]
         self._failure_counts.pop(name, None)
         self._disabled.discard(name)
+        self._invalidate_dispatch_tables()
 
         # Remove from sys.modules
         module_name = self._modules.pop(name, None)
@@ -275,17 +283,21 @@ class PluginManager:
         Returns True if a plugin consumed the message.
         Handlers are checked in priority order (lower = first).
         """
-        # Build a sorted list of all handlers across plugins
-        all_handlers = []
-        for name, instance in self._plugins.items():
-            if name in self._disabled:
+        if self._handler_table is None:
+            # Sorted list of all handlers across plugins, patterns precompiled
+            table = []
+            for name, instance in self._plugins.items():
+                if name in self._disabled:
+                    continue
+                for handler in instance._message_handlers:
+                    table.append((name, re.compile(handler["pattern"], re.IGNORECASE), handler))
+            table.sort(key=lambda x: x[2].get("priority", 100))
+            self._handler_table = table
+
+        for plugin_name, pattern, handler in self._handler_table:
+            if plugin_name in self._disabled:
                 continue
-            for handler in instance._message_handlers:
-                all_handlers.append((name, handler))
-        all_handlers.sort(key=lambda x: x[1].get("priority", 100))
-
-        for plugin_name, handler in all_handlers:
-            if re.search(handler["pattern"], message.content, re.IGNORECASE):
+            if pattern.search(message.content):
                 result = await self._safe_call(
                     plugin_name, handler["callback"](message),
                     timeout=handler.get("timeout"),
@@ -315,15 +327,16 @@ class PluginManager:
         Plugins can define a `suppress_text(message)` method that returns True
         to signal the bot should not send text (e.g. voice mode sends audio instead).
         """
-        for name, instance in self._plugins.items():
+        if self._suppress_providers is None:
+            self._suppress_providers = self._providers("suppress_text")
+        for name, instance in self._suppress_providers:
             if name in self._disabled:
                 continue
-            if hasattr(instance, "suppress_text"):
-                result = instance.suppress_text(message)
-                logger.debug(f"[TTS-DEBUG] {name}.suppress_text() = {result} "
-                            f"for user {message.author.id}")
-                if result:
-                    return True
+            result = instance.suppress_text(message)
+            logger.debug(f"[TTS-DEBUG] {name}.suppress_text() = {result} "
+                        f"for user {message.author.id}")
+            if result:
+                return True
         return False
 
     def get_system_prompt_override(self, user_id: int) -> str | None:
@@ -332,15 +345,30 @@ class PluginManager:
         Plugins can define a `get_system_prompt_override(user_id)` method that
         returns a replacement system prompt, or None to use the default.
         """
-        for name, instance in self._plugins.items():
+        if self._override_providers is None:
+            self._override_providers = self._providers("get_system_prompt_override")
+        for name, instance in self._override_providers:
             if name in self._disabled:
                 continue
-            if hasattr(instance, "get_system_prompt_override"):
-                override = instance.get_system_prompt_override(user_id)
-                if override is not None:
-                    return override
+            override = instance.get_system_prompt_override(user_id)
+            if override is not None:
+                return override
         return None
 
+    def _providers(self, method: str) -> List[tuple]:
+        """(name, instance) for every loaded plugin that defines `method`."""
+        return [
+            (name, instance) for name, instance in self._plugins.items()
+            if hasattr(instance, method)
+        ]
+
+    def _invalidate_dispatch_tables(self):
+        """Drop cached handler/provider tables after the plugin set changes."""
+        self._handler_table = None
+        self._suppress_providers = None
+        self._override_providers = None
+        self.version += 1
+
     # ── Error isolation ────────────────────────────────────────────────
 
     async def _safe_call(self, plugin_name: str, coro, timeout: float = None) -> Any:
@@ -360,6 +388,7 @@ class PluginManager:
         self._failure_counts[name] = self._failure_counts.get(name, 0) + 1
         if self._failure_counts[name] >= MAX_FAILURES:
             self._disabled.add(name)
+            self._invalidate_dispatch_tables()
             logger.warning(
                 f"Plugin {name} auto-disabled after {MAX_FAILURES} consecutive failures"
             )
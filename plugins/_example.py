@@ -62,6 +62,8 @@ class ExamplePlugin(BasePlugin):
     # self.ctx.active_model          — current LLM model name
     # self.ctx.system_prompt         — current system prompt
     # self.ctx.get_context(srv, ch)  — conversation history (copy)
+    # await self.ctx.append_to_context(srv, ch, entry)
+    #                                — add to history (async: must be awaited)
     # self.ctx.query_llm(prompt)     — query the active LLM
     # self.ctx.send_message(ch, msg) — send to a Discord channel
     # self.ctx.ollama_client         — direct OllamaClient access
@@ -1,12 +1,21 @@
 """RAG (Retrieval-Augmented Generation) system for wiki content"""
 
 import os
+import hashlib
 import logging
-from typing import List, Dict, Any
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import chromadb
+import numpy as np
+import torch
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
+from config import RAG_EMBED_DEVICE
 from wiki_parser import WikiParser
 from sandbox import safe_path
 
@@ -20,6 +29,45 @@ except ImportError:
     TOKENIZER_AVAILABLE = False
     logger.warning("transformers not available. Falling back to word counting for token estimation.")
 
+# Forward-pass batch size for SentenceTransformer.encode when indexing
+EMBED_BATCH_SIZE = 512
+
+# Fields search() asks Chroma for by default
+SEARCH_INCLUDE = ("documents", "metadatas", "distances")
+
+# Parsed batches buffered ahead of the embedder while indexing
+INDEX_QUEUE_DEPTH = 4
+
+# Query embeddings kept for reuse by search()
+QUERY_EMBEDDING_CACHE_SIZE = 50_000
+
+# Vector bytes kept in the on-disk chunk embedding cache; least recently used
+# rows (stale page revisions, other device/precision variants) go first
+EMBEDDING_CACHE_MAX_BYTES = 4 * 1024 ** 3
+
+# Collection sizes at which configure_hnsw_params steps up to the next tier
+HNSW_MEDIUM_TIER = 100_000
+HNSW_LARGE_TIER = 1_000_000
+
+
+def configure_hnsw_params(vector_count: int) -> Tuple[int, int, int]:
+    """
+    Pick HNSW (M, construction_ef, search_ef) for a collection of this size.
+
+    Chroma's default search_ef is 10, which is too small to rank results
+    reliably; larger graphs also need more links and a wider build beam to
+    keep recall up. Small indexes stay cheap to build.
+    """
+    if vector_count < HNSW_MEDIUM_TIER:
+        return 16, 128, 100
+    if vector_count < HNSW_LARGE_TIER:
+        return 32, 200, 150
+    return 48, 400, 200
+
+
+_PRIMITIVE_TYPES = frozenset((str, int, float, bool))
+
+
 def _sanitize_metadata(metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Ensure metadata only contains str, int, float, or bool.
@@ -30,9 +78,12 @@ def _sanitize_metadata(metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     for m in metadatas:
         safe_m = {}
         for k, v in m.items():
-            if v is None:
+            # Exact-type set lookup first: the common case, no MRO walk
+            if type(v) in _PRIMITIVE_TYPES:
+                safe_m[k] = v
+            elif v is None:
                 continue
-            if isinstance(v, (str, int, float, bool)):
+            elif isinstance(v, (str, int, float, bool)):
                 safe_m[k] = v
             elif isinstance(v, list):
                 safe_m[k] = "|".join(map(str, v))  # join lists into string
@@ -42,6 +93,161 @@ def _sanitize_metadata(metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return safe_list
 
 
+class _EmbeddingCache:
+    """
+    Disk-backed map from chunk text to its embedding, so re-indexing a dump
+    only encodes chunks whose text changed.
+
+    Keys are blake2b digests of model name + text; vectors are stored as
+    float16 (they are unit-normalized, so the precision loss is negligible).
+    Past max_bytes of vectors, the least recently used rows are pruned.
+    """
+
+    # SQLite's default limit on bound parameters is 999
+    _LOOKUP_CHUNK = 900
+    # Prune down to this fraction of max_bytes so pruning isn't run per batch
+    _PRUNE_TO = 0.9
+
+    def __init__(self, path: str, namespace: str, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES):
+        self._prefix = f"{namespace}\0".encode("utf-8")
+        self.max_bytes = max_bytes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key BLOB PRIMARY KEY, vec BLOB NOT NULL, used INTEGER NOT NULL DEFAULT 0"
+            ") WITHOUT ROWID"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+        if "used" not in columns:
+            # Caches written before pruning existed; their rows go first
+            self._conn.execute("ALTER TABLE embeddings ADD COLUMN used INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)")
+        self._conn.commit()
+        self._rows, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings"
+        ).fetchone()
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(self._prefix + text.encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found: Dict[bytes, np.ndarray] = {}
+        now = int(time.time())
+        for start in range(0, len(keys), self._LOOKUP_CHUNK):
+            chunk = keys[start:start + self._LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for key, vec in rows:
+                found[key] = np.frombuffer(vec, dtype=np.float16)
+            if rows:
+                self._conn.execute(
+                    f"UPDATE embeddings SET used = ? WHERE key IN ({placeholders})",
+                    [now, *chunk],
+                )
+        self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[bytes, np.ndarray]):
+        now = int(time.time())
+        rows = [(key, vec.astype(np.float16).tobytes(), now) for key, vec in items.items()]
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vec, used) VALUES (?, ?, ?)", rows
+        )
+        self._conn.commit()
+        # Callers only put misses, so replaced rows are rare enough to ignore
+        self._rows += len(rows)
+        self._bytes += sum(len(vec) for _, vec, _ in rows)
+        if self._bytes > self.max_bytes:
+            self._prune()
+
+    def _prune(self):
+        """Drop least recently used rows down to _PRUNE_TO of max_bytes."""
+        row_bytes = self._bytes / max(self._rows, 1)
+        excess = int((self._bytes - self.max_bytes * self._PRUNE_TO) / row_bytes) + 1
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY used LIMIT ?)",
+            (excess,),
+        )
+        self._conn.commit()
+        self._rows, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings"
+        ).fetchone()
+        logger.info(
+            f"Pruned embedding cache to {self._rows} vectors ({self._bytes / 1024 ** 2:.0f} MiB)"
+        )
+
+
+class SmartRAGCache:
+    """
+    Thread-safe LRU of search results, bounded by approximate size in bytes,
+    with entries expiring after ttl seconds.
+
+    Entries are copied in and out, so callers that sort or edit the returned
+    result dicts cannot corrupt the cached copy.
+    """
+
+    def __init__(self, max_bytes: int = 100_000_000, ttl: float = 600.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _size(results: List[Dict[str, Any]]) -> int:
+        # Chunk text dominates; the rest is a rough per-result overhead
+        return sum(len(r.get("content") or "") + 256 for r in results)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(r) for r in entry[2]]
+
+    def put(self, key: str, results: List[Dict[str, Any]]):
+        size = self._size(results)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (time.monotonic(), size, [dict(r) for r in results])
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
 class RAGSystem:
     """Manage vector database and retrieval for wiki content"""
 
@@ -50,57 +256,170 @@ class RAGSystem:
         db_path: str = "./chroma_db",
         collection_name: str = "maplestory_wiki",
         model_name: str = "all-mpnet-base-v2",  # Upgraded model
+        hnsw_m: Optional[int] = None,
+        hnsw_construction_ef: Optional[int] = None,
+        hnsw_search_ef: Optional[int] = None,
+        use_ip: Optional[bool] = None,
+        chunk_size: int = 500,
+        chunk_overlap: int = 100,  # Increased overlap for better context
     ):
+        """
+        HNSW params left as None come from configure_hnsw_params().
+
+        use_ip creates the collection with inner-product distance, which
+        ranks the same as cosine for the unit-normalized embeddings stored
+        here but skips hnswlib's per-vector normalization. It only applies
+        when the collection is (re)created; existing ones need
+        clear_collection() and a reindex. None keeps whatever space an
+        existing collection was built with.
+        """
         self.db_path = db_path
         self.collection_name = collection_name
         self._model_name = model_name
 
+        # M and construction_ef only take effect when the collection is
+        # created, so a new (empty) collection gets the smallest tier
+        default_m, default_efc, default_efs = configure_hnsw_params(0)
+        self.hnsw_m = hnsw_m or default_m
+        self.hnsw_construction_ef = hnsw_construction_ef or default_efc
+        self.hnsw_search_ef = hnsw_search_ef or default_efs
+        self.hnsw_space = "ip" if use_ip else "cosine"
+
         # Defer model loading until RAG is actually used
         self._embedding_model = None
         self._tokenizer = None
         self._models_loaded = False
+        self._emb_cache: Optional[_EmbeddingCache] = None
+        self._embed_variant = ""  # e.g. "cuda-fp16", set by _load_models
+
+        # Search results are only valid for the collection contents they came
+        # from; every write bumps the epoch, which is part of the cache key
+        self._result_cache = SmartRAGCache()
+        self._cache_epoch = 0
+
+        # blake2b(query) -> float16 query embedding
+        self._qemb_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._qemb_lock = threading.Lock()
 
         self.client = chromadb.PersistentClient(
             path=db_path,
             settings=Settings(anonymized_telemetry=False),
         )
 
+        self.collection = self._open_collection()
+
+        existing_space = self.collection_space()
+        if existing_space is None:
+            # optimize_for_search() below records our assumption, so this
+            # only fires once per collection
+            logger.warning(
+                f"Collection {collection_name} doesn't record its distance space; "
+                f"assuming {self.hnsw_space}"
+            )
+        elif use_ip is None and existing_space in ("ip", "cosine"):
+            self.hnsw_space = existing_space
+        elif existing_space != self.hnsw_space:
+            logger.warning(
+                f"Collection {collection_name} uses hnsw:space={existing_space}, not "
+                f"{self.hnsw_space}; clear and reindex to switch"
+            )
+
+        # An existing collection keeps its build params, but search_ef can be
+        # retuned in place: older collections never set it (Chroma uses 10),
+        # and a grown collection wants its size tier's beam
         try:
-            self.collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={
-                    "hnsw:space": "cosine",
-                    "hnsw:construction_ef": 128,  # higher = more accurate but slower
-                    "hnsw:M": 16,  # connectivity parameter
-                },
+            if hnsw_search_ef is None:
+                self.hnsw_search_ef = configure_hnsw_params(self.collection.count())[2]
+            current_efs = (self.collection.metadata or {}).get("hnsw:search_ef", 10)
+            if current_efs != self.hnsw_search_ef or existing_space is None:
+                self.optimize_for_search(self.hnsw_search_ef)
+        except Exception as e:
+            logger.error(
+                f"Could not set hnsw:search_ef={self.hnsw_search_ef} on {collection_name}; "
+                f"queries keep the collection's current beam: {e}"
             )
-            logger.info(f"Using collection: {collection_name}")
+
+        self.parser = WikiParser(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def _open_collection(self):
+        """Open the collection, creating it with our HNSW params if missing."""
+        try:
+            collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata=self._hnsw_metadata(),
+            )
+            logger.info(f"Using collection: {self.collection_name}")
+            return collection
         except AttributeError:
+            # Older chromadb clients without get_or_create_collection
             try:
-                self.collection = self.client.get_collection(collection_name)
-                logger.info(f"Loaded existing collection: {collection_name}")
+                collection = self.client.get_collection(self.collection_name)
+                logger.info(f"Loaded existing collection: {self.collection_name}")
+                return collection
             except Exception:
-                self.collection = self.client.create_collection(
-                    name=collection_name, 
-                    metadata={
-                        "hnsw:space": "cosine",
-                        "hnsw:construction_ef": 128,
-                        "hnsw:M": 16,
-                    }
-                )
-                logger.info(f"Created new collection: {collection_name}")
+                collection = self._create_collection()
+                logger.info(f"Created new collection: {self.collection_name}")
+                return collection
+
+    def _create_collection(self):
+        return self.client.create_collection(
+            name=self.collection_name,
+            metadata=self._hnsw_metadata(),
+        )
+
+    def _hnsw_metadata(self) -> Dict[str, Any]:
+        """Collection metadata used whenever the collection is (re)created."""
+        return {
+            "hnsw:space": self.hnsw_space,
+            "hnsw:construction_ef": self.hnsw_construction_ef,  # higher = more accurate but slower
+            "hnsw:M": self.hnsw_m,  # connectivity parameter
+            "hnsw:search_ef": self.hnsw_search_ef,  # query beam width; Chroma defaults to 10
+            # modify() replaces the whole metadata dict but rejects hnsw:space,
+            # so the space is kept under our own key as well
+            "rag:space": self.hnsw_space,
+        }
 
-        self.parser = WikiParser(chunk_size=500, chunk_overlap=100)  # Increased overlap for better context
+    def collection_space(self) -> Optional[str]:
+        """Distance space the live collection was built with, if recorded."""
+        metadata = self.collection.metadata or {}
+        return metadata.get("rag:space") or metadata.get("hnsw:space")
+
+    def optimize_for_search(self, ef: int):
+        """Retune hnsw:search_ef on the live collection without reindexing."""
+        # modify() rejects build-time hnsw keys such as hnsw:space, even when
+        # unchanged, and replaces the metadata wholesale, so rag:space is
+        # resent to keep the space readable on the next start
+        self.collection.modify(metadata={"hnsw:search_ef": ef, "rag:space": self.hnsw_space})
+        self.hnsw_search_ef = ef
+        logger.info(f"Set hnsw:search_ef={ef} on {self.collection_name}")
 
     def _load_models(self):
         """Lazily load embedding model and tokenizer on first use."""
         if self._models_loaded:
             return
-        logger.info(f"Loading embedding model: {self._model_name}")
-        self._embedding_model = SentenceTransformer(self._model_name)
+        device = RAG_EMBED_DEVICE or ("cuda" if torch.cuda.is_available() else "cpu")
+        logger.info(f"Loading embedding model: {self._model_name} on {device}")
+        model = SentenceTransformer(self._model_name, device=device)
+        if device.startswith("cuda"):
+            # FP16 halves weight/activation bandwidth and uses tensor cores
+            model = model.half()
+            precision = "fp16"
+        else:
+            # int8 dynamic quantization of the Linear layers speeds up CPU matmuls
+            try:
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+                precision = "int8"
+            except Exception as e:
+                logger.warning(f"Could not quantize embedding model: {e}. Using FP32.")
+                precision = "fp32"
+        self._embedding_model = model
+        # Vectors differ slightly per device/precision; cached ones must match
+        self._embed_variant = f"{device.split(':')[0]}-{precision}"
         if TOKENIZER_AVAILABLE:
             try:
-                self._tokenizer = AutoTokenizer.from_pretrained("gpt2")
+                self._tokenizer = AutoTokenizer.from_pretrained("gpt2", use_fast=True)
             except Exception as e:
                 logger.warning(f"Could not load tokenizer: {e}. Falling back to word counting.")
                 self._tokenizer = None
@@ -116,24 +435,134 @@ class RAGSystem:
         self._load_models()
         return self._tokenizer
 
-    def index_wiki_dump(self, xml_path: str, batch_size: int = 100):
+    @property
+    def embedding_cache(self) -> _EmbeddingCache:
+        if self._emb_cache is None:
+            # Namespaced by model and device/precision, so a CPU (int8) and a
+            # GPU (fp16) reindex never reuse each other's vectors
+            self._load_models()
+            self._emb_cache = _EmbeddingCache(
+                os.path.join(self.db_path, "_emb_cache.sqlite"),
+                f"{self._model_name}|{self._embed_variant}",
+            )
+        return self._emb_cache
+
+    @staticmethod
+    def _query_key(query: str) -> bytes:
+        return hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+
+    def _query_embeddings(self, queries: List[str], keys: List[bytes]) -> List[List[float]]:
+        """
+        Embeddings for search queries, reusing earlier encodes of the same
+        text and encoding the rest in one batch.
+
+        Unlike search results these only depend on the model, so the cache
+        survives collection writes and clear_collection().
+        """
+        with self._qemb_lock:
+            vectors = {}
+            for key in keys:
+                vec = self._qemb_cache.get(key)
+                if vec is not None:
+                    self._qemb_cache.move_to_end(key)
+                    vectors[key] = vec
+        misses = {key: query for key, query in zip(keys, queries) if key not in vectors}
+        if misses:
+            encoded = self._encode(
+                list(misses.values()),
+                batch_size=EMBED_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            with self._qemb_lock:
+                for key, vec in zip(misses, encoded):
+                    vectors[key] = self._qemb_cache[key] = vec.astype(np.float16)
+                while len(self._qemb_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+                    self._qemb_cache.popitem(last=False)
+        return [vectors[key].astype(np.float32).tolist() for key in keys]
+
+    def _encode(self, texts: List[str], **kwargs):
+        """Embed texts with autograd bookkeeping disabled."""
+        with torch.inference_mode():
+            return self.embedding_model.encode(texts, **kwargs)
+
+    def index_wiki_dump(self, xml_path: str, batch_size: int = 1024):
+        """
+        Parse, chunk, embed and insert a MediaWiki XML dump.
+
+        Parsing runs on a background thread feeding a bounded queue, so the
+        next batch is being parsed while the current one is embedded (the
+        encode releases the GIL inside torch).
+        """
         xml_path = safe_path(xml_path)
         logger.info(f"Starting to index wiki dump: {xml_path}")
 
+        batches: "queue.Queue[Optional[Tuple[List[str], List[Dict[str, Any]], List[str]]]]" = (
+            queue.Queue(maxsize=INDEX_QUEUE_DEPTH)
+        )
+        stop = threading.Event()
+        producer_errors: List[BaseException] = []
+
+        def put(item) -> bool:
+            # Timed puts so the parser notices if the consumer has bailed out
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for batch in self._iter_wiki_batches(xml_path, batch_size):
+                    if not put(batch):
+                        return
+            except BaseException as e:
+                producer_errors.append(e)
+            finally:
+                put(None)
+
+        producer = threading.Thread(target=produce, name="wiki-parse", daemon=True)
+        producer.start()
+
+        total_chunks = 0
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                self._add_to_collection(*batch, trusted=True)
+                total_chunks += len(batch[0])
+                logger.info(f"Indexed {total_chunks} chunks")
+        finally:
+            stop.set()
+            producer.join()
+
+        if producer_errors:
+            raise producer_errors[0]
+
+        logger.info(f"Indexing complete. Total chunks indexed: {total_chunks}")
+
+    def _iter_wiki_batches(self, xml_path: str, batch_size: int):
+        """Yield (documents, metadatas, ids) batches of up to batch_size chunks."""
         documents: List[str] = []
         metadatas: List[Dict[str, Any]] = []
         ids: List[str] = []
-        total_chunks = 0
+        timestamp = datetime.now().isoformat()  # indexing time, shared by the run
 
         for page in self.parser.parse_wiki_xml(xml_path):
             title = str(page.get("title") or "Untitled")
-            categories = page.get("categories") or ""
+            categories = str(page.get("categories") or "")
             content = page.get("content") or ""
 
             chunks = self.parser.chunk_text(
                 content,
                 metadata={"title": title, "categories": categories},
             )
+            # Per-page values, computed once instead of per chunk
+            doc_length = len(content.split())
+            position_denom = max(1, len(chunks) - 1)
 
             for chunk in chunks:
                 doc_id = f"{title}_{chunk['chunk_index']}"
@@ -146,80 +575,154 @@ class RAGSystem:
                     "word_count": int(chunk.get("word_count", 0)),
                     "categories": categories,
                     "content_length": len(chunk["text"]),  # character count
-                    "timestamp": datetime.now().isoformat(),  # indexing time
-                    "doc_length": len(content.split()),  # total words in original doc
-                    "relative_position": chunk.get("chunk_index", 0) / max(1, len(chunks)-1)  # position in doc
+                    "timestamp": timestamp,  # indexing time
+                    "doc_length": doc_length,  # total words in original doc
+                    "relative_position": chunk.get("chunk_index", 0) / position_denom  # position in doc
                 }
                 metadatas.append(md)
                 ids.append(doc_id)
 
                 if len(documents) >= batch_size:
-                    self._add_to_collection(documents, metadatas, ids)
-                    total_chunks += len(documents)
-                    logger.info(f"Indexed {total_chunks} chunks")
-                    documents.clear()
-                    metadatas.clear()
-                    ids.clear()
+                    yield documents, metadatas, ids
+                    documents, metadatas, ids = [], [], []
 
         if documents:
-            self._add_to_collection(documents, metadatas, ids)
-            total_chunks += len(documents)
-
-        logger.info(f"Indexing complete. Total chunks indexed: {total_chunks}")
+            yield documents, metadatas, ids
 
     def _add_to_collection(
-        self, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]
+        self,
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str],
+        trusted: bool = False,
     ):
+        """Embed and insert a batch. trusted=True skips metadata sanitizing
+        for callers that only build str/int/float/bool values."""
         if not documents:
             return
 
-        embeddings = self.embedding_model.encode(documents, show_progress_bar=False)
-        if hasattr(embeddings, "tolist"):
-            embeddings = embeddings.tolist()
+        # Reuse embeddings of chunks seen in earlier runs; encode the rest
+        cache = self.embedding_cache
+        keys = [cache.key(doc) for doc in documents]
+        vectors = cache.get_many(keys)
+        misses = {key: doc for key, doc in zip(keys, documents) if key not in vectors}
+        if misses:
+            # sentence-transformers sorts each call's inputs by length before
+            # batching, so one big call per flush keeps padding waste low
+            encoded = self._encode(
+                list(misses.values()),
+                batch_size=EMBED_BATCH_SIZE,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+            )
+            fresh = {key: vec.astype(np.float16) for key, vec in zip(misses, encoded)}
+            cache.put_many(fresh)
+            vectors.update(fresh)
+        logger.debug(f"Embedding cache: {len(documents) - len(misses)} hits, {len(misses)} encoded")
+
+        embeddings = np.stack([vectors[key] for key in keys]).astype(np.float32)
 
         self.collection.add(
             documents=documents,
-            embeddings=embeddings,
-            metadatas=_sanitize_metadata(metadatas),
+            embeddings=embeddings.tolist(),
+            metadatas=metadatas if trusted else _sanitize_metadata(metadatas),
             ids=ids,
         )
+        self._invalidate_results()
 
-    def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        query_embedding = self.embedding_model.encode([query])
-        if hasattr(query_embedding, "tolist"):
-            query_embedding = query_embedding.tolist()
+    def _invalidate_results(self):
+        """Drop cached search results after the collection changes."""
+        self._cache_epoch += 1
+        self._result_cache.clear()
+
+    def search(
+        self,
+        query: str,
+        n_results: int = 5,
+        max_content_chars: Optional[int] = None,
+        include: Tuple[str, ...] = SEARCH_INCLUDE,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top n_results chunks for query; content is cut to max_content_chars if given.
+
+        Leave "documents" out of include when only titles/scores are needed:
+        Chroma then skips loading chunk text and results have no "content".
+        """
+        query_key = self._query_key(query)
+        cache_key = (
+            f"{query_key.hex()}:{n_results}:{max_content_chars}:{','.join(include)}"
+            f":{self._cache_epoch}"
+        )
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
         results = self.collection.query(
-            query_embeddings=query_embedding,
+            query_embeddings=self._query_embeddings([query], [query_key]),
             n_results=n_results,
-            include=["documents", "metadatas", "distances"],
+            include=list(include),
         )
 
-        formatted_results: List[Dict[str, Any]] = []
-        docs = results.get("documents", [[]])
-        metas = results.get("metadatas", [[]])
-        dists = results.get("distances", [[]])
-
-        if docs and docs[0]:
-            for i, doc in enumerate(docs[0]):
-                meta = metas[0][i] if i < len(metas[0]) else {}
-                dist = dists[0][i] if (dists and dists[0] and i < len(dists[0])) else None
-                score = (1 - dist) if dist is not None else None
-                formatted_results.append(
-                    {
-                        "content": doc,
-                        "title": meta.get("title", "Unknown"),
-                        "categories": meta.get("categories"),
-                        "chunk_index": meta.get("chunk_index"),
-                        "score": score,
-                        "word_count": meta.get("word_count"),
-                        "content_length": meta.get("content_length"),
-                        "relative_position": meta.get("relative_position"),
-                    }
-                )
+        formatted_results = self._format_results(results, 0, max_content_chars)
+        self._result_cache.put(cache_key, formatted_results)
+        return formatted_results
+
+    @staticmethod
+    def _format_results(
+        results: Dict[str, Any], row: int, max_content_chars: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Flatten one query's row of a Chroma query response into result dicts."""
+        ids = (results.get("ids") or [[]])[row]
+        docs = (results.get("documents") or [None])[row]
+        metas = (results.get("metadatas") or [None])[row] or []
+        dists = (results.get("distances") or [None])[row] or []
 
+        formatted_results: List[Dict[str, Any]] = []
+        for i in range(len(ids)):
+            meta = (metas[i] if i < len(metas) else None) or {}
+            dist = dists[i] if i < len(dists) else None
+            score = (1 - dist) if dist is not None else None
+            result: Dict[str, Any] = {}
+            if docs is not None:
+                doc = docs[i]
+                if max_content_chars is not None:
+                    doc = doc[:max_content_chars]
+                result["content"] = doc
+            result.update({
+                "title": meta.get("title", "Unknown"),
+                "categories": meta.get("categories"),
+                "chunk_index": meta.get("chunk_index"),
+                "score": score,
+                "word_count": meta.get("word_count"),
+                "content_length": meta.get("content_length"),
+                "relative_position": meta.get("relative_position"),
+            })
+            formatted_results.append(result)
         return formatted_results
 
+    def _count_tokens(self, texts: List[str], max_tokens: int) -> List[int]:
+        """
+        Token count per text, in one batched tokenizer call.
+
+        Counts are capped at max_tokens + 1: enough to tell that a text
+        doesn't fit, without tokenizing the rest of it.
+        """
+        # Use actual tokenizer for more accurate token counting if available
+        if self.tokenizer and texts:
+            try:
+                encoded = self.tokenizer(
+                    texts,
+                    add_special_tokens=False,
+                    truncation=True,
+                    max_length=max_tokens + 1,
+                    return_length=True,
+                )
+                return list(encoded["length"])
+            except Exception:
+                pass  # Fallback to word counting if tokenizer fails
+        return [len(text.split()) for text in texts]
+
     def get_context_for_query(self, query: str, max_tokens: int = 2000) -> str:
         results = self.search(query, n_results=20)
         if not results:
@@ -228,36 +731,35 @@ class RAGSystem:
         context_parts: List[str] = []
         current_tokens = 0
 
+        # Pull the sort keys out once instead of per comparison
+        scores = np.fromiter((r.get("score") or 0 for r in results), dtype=float, count=len(results))
+        positions = np.fromiter(
+            (r.get("relative_position") or 0 for r in results), dtype=float, count=len(results)
+        )
+        # Distance from the middle of the document; lower is more coherent.
+        # Chunks missing a position count as mid-document.
+        centre_dist = np.abs(np.fromiter(
+            (0.5 if r.get("relative_position") is None else r["relative_position"] for r in results),
+            dtype=float, count=len(results),
+        ) - 0.5)
+
         # Sort results by score (relevance) and then by document coherence
-        results.sort(key=lambda x: (x.get("score", 0), -abs(x.get("relative_position", 0.5) - 0.5)), reverse=True)
-        
-        # Group results by title to prioritize chunks from the same document
-        grouped_results = {}
-        for result in results:
-            title = result.get("title", "Unknown")
-            if title not in grouped_results:
-                grouped_results[title] = []
-            grouped_results[title].append(result)
-        
-        # Flatten grouped results, prioritizing documents with more relevant chunks
-        flattened_results = []
-        for title, chunks in grouped_results.items():
-            # Sort chunks by position to maintain reading order
-            chunks.sort(key=lambda x: x.get("relative_position", 0))
-            flattened_results.extend(chunks)
-
-        for result in flattened_results:
-            # Use actual tokenizer for more accurate token counting if available
-            if self.tokenizer:
-                try:
-                    result_tokens = len(self.tokenizer.encode(result["content"]))
-                except Exception:
-                    # Fallback to word counting if tokenizer fails
-                    result_tokens = len(result["content"].split())
-            else:
-                # Fallback to word counting
-                result_tokens = len(result["content"].split())
-                
+        ranked = np.lexsort((centre_dist, -scores))
+
+        # Group results by title to prioritize chunks from the same document:
+        # each title's rank is where its best chunk landed
+        group_rank = np.empty(len(results), dtype=int)
+        first_seen: Dict[str, int] = {}
+        for rank, i in enumerate(ranked):
+            group_rank[i] = first_seen.setdefault(results[i].get("title", "Unknown"), rank)
+
+        # Flatten grouped results, sorting chunks by position within each
+        # document to maintain reading order
+        order = ranked[np.lexsort((positions[ranked], group_rank[ranked]))]
+        flattened_results = [results[i] for i in order]
+
+        token_counts = self._count_tokens([r["content"] for r in flattened_results], max_tokens)
+        for result, result_tokens in zip(flattened_results, token_counts):
             if current_tokens + result_tokens > max_tokens:
                 break
 
@@ -274,14 +776,8 @@ class RAGSystem:
     def clear_collection(self):
         try:
             self.client.delete_collection(name=self.collection_name)
-            self.collection = self.client.create_collection(
-                name=self.collection_name, 
-                metadata={
-                    "hnsw:space": "cosine",
-                    "hnsw:construction_ef": 128,
-                    "hnsw:M": 16,
-                }
-            )
+            self.collection = self._create_collection()
+            self._invalidate_results()
             logger.info("Collection cleared")
         except Exception as e:
             logger.error(f"Error clearing collection: {e}")
@@ -292,6 +788,7 @@ class RAGSystem:
             "total_chunks": count,
             "collection_name": self.collection_name,
             "db_path": self.db_path,
+            "search_cache": self._result_cache.stats(),
         }
         
     def evaluate_retrieval(self, queries_with_ground_truth: List[Dict]) -> Dict:
@@ -308,30 +805,41 @@ class RAGSystem:
         total_recall = 0
         total_reciprocal_rank = 0
         query_count = len(queries_with_ground_truth)
+
+        # Embed every query in one batch and send them to Chroma as a single
+        # multi-query call instead of one encode + round-trip per query
+        responses = None
+        if query_count:
+            queries = [item['query'] for item in queries_with_ground_truth]
+            responses = self.collection.query(
+                query_embeddings=self._query_embeddings(queries, [self._query_key(q) for q in queries]),
+                n_results=10,
+                include=["metadatas", "distances"],
+            )
         
-        for item in queries_with_ground_truth:
-            query = item['query']
+        for row, item in enumerate(queries_with_ground_truth):
             relevant_ids = set(item['relevant_doc_ids'])
             
             # Get top 10 results
-            results = self.search(query, n_results=10)
-            retrieved_ids = set([f"{r['title']}_{r['chunk_index']}" for r in results])
+            results = self._format_results(responses, row)
+            # Format each ID once; ranked list for MRR, set for precision/recall
+            ranked_ids = [f"{r['title']}_{r['chunk_index']}" for r in results]
+            retrieved_ids = set(ranked_ids)
             
             # Calculate precision and recall
             if retrieved_ids:
-                precision = len(retrieved_ids.intersection(relevant_ids)) / len(retrieved_ids)
-                recall = len(retrieved_ids.intersection(relevant_ids)) / len(relevant_ids) if relevant_ids else 0
+                hits = len(retrieved_ids & relevant_ids)
+                precision = hits / len(retrieved_ids)
+                recall = hits / len(relevant_ids) if relevant_ids else 0
             else:
                 precision = 0
                 recall = 0
                 
             # Calculate reciprocal rank
-            reciprocal_rank = 0
-            for i, result in enumerate(results):
-                result_id = f"{result['title']}_{result['chunk_index']}"
-                if result_id in relevant_ids:
-                    reciprocal_rank = 1 / (i + 1)
-                    break
+            reciprocal_rank = next(
+                (1 / (i + 1) for i, result_id in enumerate(ranked_ids) if result_id in relevant_ids),
+                0,
+            )
                     
             total_precision += precision
             total_recall += recall
@@ -8,6 +8,16 @@ from config import MAX_DISCORD_MESSAGE_LENGTH
 # Marker the LLM uses to indicate message breaks
 MESSAGE_SPLIT_MARKER = "---MSG---"
 
+# Reasoning-model thinking blocks
+_THINK_RE = re.compile(r"<think>.*?</think>", re.DOTALL)
+
+
+def strip_think_tags(text: str) -> str:
+    """Remove <think>...</think> blocks, skipping the regex when there are none."""
+    if "<think>" in text:
+        return _THINK_RE.sub("", text)
+    return text
+
 
 def split_response_by_markers(text: str) -> List[str]:
     """
@@ -20,7 +30,7 @@ def split_response_by_markers(text: str) -> List[str]:
         List of individual message strings
     """
     # Remove thinking tags first
-    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    text = strip_think_tags(text)
 
     # Split by the marker
     parts = text.split(MESSAGE_SPLIT_MARKER)
@@ -43,6 +53,10 @@ def split_long_message(text: str, limit: int = MAX_DISCORD_MESSAGE_LENGTH) -> Li
     """
     Split a long message at natural breakpoints (sentences, paragraphs).
 
+    Walks the text once: each chunk is cut at the last paragraph break,
+    line break, or sentence end inside the limit window (in that order of
+    preference), falling back to a hard cut.
+
     Args:
         text: The message to split
         limit: Maximum length per message
@@ -54,40 +68,28 @@ def split_long_message(text: str, limit: int = MAX_DISCORD_MESSAGE_LENGTH) -> Li
         return [text]
 
     messages = []
-    current = ""
-
-    # Try to split by paragraphs first
-    paragraphs = text.split('\n\n')
-
-    for para in paragraphs:
-        if len(current) + len(para) + 2 <= limit:
-            current = current + "\n\n" + para if current else para
-        else:
-            if current:
-                messages.append(current.strip())
-
-            # If single paragraph is too long, split by sentences
-            if len(para) > limit:
-                sentences = re.split(r'(?<=[.!?])\s+', para)
-                current = ""
-                for sentence in sentences:
-                    if len(current) + len(sentence) + 1 <= limit:
-                        current = current + " " + sentence if current else sentence
-                    else:
-                        if current:
-                            messages.append(current.strip())
-                        # If single sentence is too long, hard split
-                        if len(sentence) > limit:
-                            for i in range(0, len(sentence), limit):
-                                messages.append(sentence[i:i+limit])
-                            current = ""
-                        else:
-                            current = sentence
-            else:
-                current = para
-
-    if current:
-        messages.append(current.strip())
+    start, n = 0, len(text)
+    while n - start > limit:
+        end = start + limit
+        cut = text.rfind("\n\n", start, end)
+        if cut <= start:
+            cut = text.rfind("\n", start, end)
+        if cut <= start:
+            # Cut after the sentence-ending punctuation
+            cut = max(text.rfind(p, start, end) for p in (". ", "! ", "? ")) + 1
+        if cut <= start:
+            cut = end
+
+        chunk = text[start:cut].strip()
+        if chunk:
+            messages.append(chunk)
+        start = cut
+        while start < n and text[start].isspace():
+            start += 1
+
+    tail = text[start:].strip()
+    if tail:
+        messages.append(tail)
 
     return messages
 
@@ -98,7 +100,7 @@ def split_response_by_paragraphs(text: str) -> List[str]:
 
     Used for backends like Claude Code that may use either convention.
     """
-    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    text = strip_think_tags(text)
 
     # Try ---MSG--- markers first
     if MESSAGE_SPLIT_MARKER in text:
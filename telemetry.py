@@ -12,7 +12,9 @@ loop isn't blocked on SQLite I/O.
 Tables:
     ollama_calls
         Every call to the Ollama API with full prompt + response text,
-        timing, and eval counts.
+        timing, and eval counts. Full history is kept by default; set
+        TELEMETRY_OLLAMA_CALLS_MAX_ROWS (config.py) to keep only the newest
+        N rows, since every prompt carries the whole context window.
 
     image_generations
         Every Flux2 Klein generation (txt2img + img2img) with the prompt,
@@ -27,6 +29,8 @@ import threading
 import time
 from typing import Any, Optional
 
+from config import TELEMETRY_OLLAMA_CALLS_MAX_ROWS
+
 logger = logging.getLogger("telemetry")
 
 _DB_PATH = os.path.join(
@@ -37,6 +41,11 @@ _DB_PATH = os.path.join(
 _CONN_LOCK = threading.Lock()
 _INIT_DONE = False
 
+# When TELEMETRY_OLLAMA_CALLS_MAX_ROWS is set, older ollama_calls rows are
+# pruned in batches every _PRUNE_EVERY inserts so the common insert stays a
+# single statement.
+_PRUNE_EVERY = 500
+
 
 def _get_conn() -> sqlite3.Connection:
     conn = sqlite3.connect(_DB_PATH, timeout=30, check_same_thread=False)
@@ -123,7 +132,7 @@ def _record_ollama_sync(
     _init_sync()
     conn = _get_conn()
     try:
-        conn.execute(
+        cur = conn.execute(
             """INSERT INTO ollama_calls
                (ts, model, prompt, prompt_len, num_images, num_ctx, num_predict,
                 keep_alive, think, response, response_len,
@@ -137,6 +146,12 @@ def _record_ollama_sync(
                 eval_count, prompt_eval_count, duration_s, error,
             ),
         )
+        row_id = cur.lastrowid
+        if TELEMETRY_OLLAMA_CALLS_MAX_ROWS > 0 and row_id and row_id % _PRUNE_EVERY == 0:
+            conn.execute(
+                "DELETE FROM ollama_calls WHERE id <= ?",
+                (row_id - TELEMETRY_OLLAMA_CALLS_MAX_ROWS,),
+            )
         conn.commit()
     except Exception as e:
         logger.warning("failed to record ollama call: %s", e)
@@ -30,20 +30,22 @@ import os
 import re
 import sys
 import time
-from typing import List
+from collections import deque
+from typing import Deque, List
 
 import aiohttp
 
 # Add project root to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from config import CONTEXT_LIMIT, CHAT_MODEL, IMAGE_RECOGNITION_MODEL, MAX_DISCORD_MESSAGE_LENGTH
+from config import CONTEXT_LIMIT, CHAT_MODEL, IMAGE_RECOGNITION_MODEL, MAX_DISCORD_MESSAGE_LENGTH, setup_logging
 from ollama_client import OllamaClient
 from claude_code_client import ClaudeCodeClient, RateLimitError
-from models import is_claude_code_model, Txt2TxtModel
+from models import is_claude_code_model, find_txt2txt_model
 from web_extractor import extract_webpage_context, web_search, format_search_results, js_renderer
 from file_parser import FileParser
-from response_splitter import split_response_by_markers, split_response_by_paragraphs, split_long_message
+from utils import IMAGE_EXTENSIONS
+from response_splitter import split_response_by_markers, split_response_by_paragraphs, split_long_message, strip_think_tags
 
 # Image gen heuristic from bot.py
 _IMAGE_GEN_KEYWORDS = re.compile(
@@ -89,7 +91,7 @@ class TestCLI:
         self.ollama_client = OllamaClient()
         self.claude_code_client = ClaudeCodeClient()
         self.active_model = CHAT_MODEL
-        self.context: List[dict] = []
+        self.context: Deque[dict] = deque(maxlen=CONTEXT_LIMIT)
         self.system_prompt = (
             "Your responses should be akin to that of a typical millenial texter: short, to the point, and mostly without punctuation. Do not offer any kind of assistance without being prompted. use slang *sparingly*. \n\n"
             "MULTI-MESSAGE RESPONSES:\n"
@@ -139,6 +141,7 @@ class TestCLI:
         class _MockBot:
             def __init__(self, cli):
                 self.context = {}
+                self._last_has_image = {}
                 self.active_model = cli.active_model
                 self.system_prompt = cli.system_prompt
                 self.ollama_client = cli.ollama_client
@@ -150,6 +153,13 @@ class TestCLI:
             def get_channel(self, _):
                 return None
 
+            async def append_context(self, server, channel, entry):
+                # Plain bounded window: no anchors, summary or persistence in CLI mode
+                self.context.setdefault(server, {}).setdefault(
+                    channel, deque(maxlen=CONTEXT_LIMIT)
+                ).append(entry)
+                self._last_has_image[(server, channel)] = bool(entry.get("images"))
+
         mock = _MockBot(self)
         pm = PluginManager(mock)
         # Skip slash command registration in CLI mode
@@ -200,24 +210,24 @@ class TestCLI:
         prompt = text
 
         # Split attachments into image files (for img2img) and documents
-        image_exts = {".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif"}
         image_files: List[str] = []
         doc_files: List[str] = []
         for path in self.pending_attachments:
             ext = os.path.splitext(path)[1].lower()
-            if ext in image_exts:
+            if ext in IMAGE_EXTENSIONS:
                 image_files.append(path)
             else:
                 doc_files.append(path)
 
         # Process document attachments (PDFs, code, text)
         if doc_files:
-            doc_context = ""
-            for path in doc_files:
-                content = FileParser.parse_file(path)
+            doc_parts = []
+            contents = await asyncio.gather(*(FileParser.parse_file_async(path) for path in doc_files))
+            for path, content in zip(doc_files, contents):
                 if content:
                     filename = os.path.basename(path)
-                    doc_context += f"\n\n--- Content of {filename} ---\n{content}\n--------------------------\n"
+                    doc_parts.append(f"\n\n--- Content of {filename} ---\n{content}\n--------------------------\n")
+            doc_context = "".join(doc_parts)
             if doc_context:
                 prompt += f"\n\n[Attached Documents Context]{doc_context}"
 
@@ -237,30 +247,27 @@ class TestCLI:
             "image_files": image_files,
         })
 
-        # Maintain context limit
-        if len(self.context) > CONTEXT_LIMIT:
-            self.context.pop(0)
-
         return fetched_sources
 
     def format_prompt(self, messages: List[dict]) -> str:
         """Format messages into a prompt string."""
-        prompt = ""
+        parts = []
         for msg in messages:
             role = "User" if msg["role"] == "user" else "Assistant"
             name = f"({msg['name']})" if msg["role"] == "user" and "name" in msg else ""
-            prompt += f"{role} {name}: {msg['content']}\n"
-        prompt += "Assistant: "
-        return prompt
+            parts.append(f"{role} {name}: {msg['content']}\n")
+        parts.append("Assistant: ")
+        return "".join(parts)
 
     def process_response(self, text: str) -> List[str]:
         """Process response: strip thinking tags, split for length."""
-        text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+        text = strip_think_tags(text)
         return split_long_message(text.strip(), MAX_DISCORD_MESSAGE_LENGTH)
 
     async def query(self) -> List[str]:
         """Query Ollama, same logic as bot.py's query_ollama."""
-        messages = self.context
+        # Snapshot the deque as a list so the slicing below (messages[-4:]) works
+        messages = list(self.context)
         user_content = messages[-1]["content"]
 
         # Check if this is an image generation task (fast heuristic first)
@@ -280,7 +287,10 @@ class TestCLI:
 
             from image_generation import ImageGenerator
             img_gen = ImageGenerator()
-            is_img_task = await img_gen.is_image_generation_task(classify_input)
+            try:
+                is_img_task = await img_gen.is_image_generation_task(classify_input)
+            finally:
+                await img_gen.ollama_client.close()
 
             if is_img_task:
                 from image_generation import (
@@ -414,14 +424,14 @@ class TestCLI:
             else:
                 print(c("  [LLM says no search needed]", "dim"))
 
-        # Build prompt (web content already injected by build_context)
-        prompt = self.format_prompt(messages)
+        # Build prompt (web content already injected by build_context).
+        # Same layout as bot.py: stable system prompt + history first,
+        # per-turn context after, so Ollama can reuse the cached prefix.
+        prompt = f"System: {self.system_prompt}\n" + self.format_prompt(messages)
 
         # Add search summary if available
         if search_summary:
-            prompt = f"Search Results Summary:\n{search_summary}\n\n{prompt}"
-
-        prompt = f"System: {self.system_prompt}\n" + prompt
+            prompt = f"{prompt}\n\nSearch Results Summary:\n{search_summary}"
 
         print(c(f"  [model: {model}]", "dim"))
 
@@ -727,7 +737,7 @@ class TestCLI:
                         self.pending_attachments.append(arg)
                         print(c(f"  Attached: {os.path.basename(arg)}", "yellow"))
                 elif cmd == "/clear":
-                    self.context = []
+                    self.context.clear()
                     print(c("  Context cleared", "yellow"))
                 elif cmd == "/context":
                     self.show_context()
@@ -766,11 +776,7 @@ class TestCLI:
                 elif cmd == "/model":
                     if arg:
                         # Try to match by enum name or value
-                        matched = None
-                        for m in Txt2TxtModel:
-                            if arg.lower() in (m.name.lower(), m.value.lower()):
-                                matched = m
-                                break
+                        matched = find_txt2txt_model(arg)
                         if matched:
                             self.active_model = matched.value
                             print(c(f"  Model switched to: {matched.name} ({matched.value})", "yellow"))
@@ -877,9 +883,11 @@ async def _async_main():
         await cli.run()
     finally:
         await js_renderer.stop()
+        await cli.ollama_client.close()
 
 
 def main():
+    setup_logging()
     asyncio.run(_async_main())
 
 
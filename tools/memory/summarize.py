@@ -21,6 +21,7 @@ import argparse
 import asyncio
 import json
 import os
+import re
 import sys
 import time
 from datetime import datetime, timezone, timedelta
@@ -56,6 +57,9 @@ from config import (
 # Claude CLI path — use absolute path for cron compatibility
 CLAUDE_CLI = os.path.expanduser("~/.local/bin/claude")
 
+# Opening ```json / ``` line and closing ``` around a fenced reply
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*[ \t]*\n?|\n?[ \t]*```\s*$")
+
 
 def _should_run(guild_id: str) -> dict:
     """Check if we should run summarization. Returns status dict."""
@@ -268,13 +272,8 @@ async def _call_claude(prompt: str) -> str:
 
 def _parse_summary_response(response: str) -> dict:
     """Parse the JSON response from Claude, handling markdown fences."""
-    text = response.strip()
     # Strip markdown code fences if present
-    if text.startswith("```"):
-        lines = text.split("\n")
-        # Remove first line (```json or ```) and last line (```)
-        lines = [l for l in lines if not l.strip().startswith("```")]
-        text = "\n".join(lines)
+    text = _FENCE_RE.sub("", response.strip())
 
     try:
         return json.loads(text)
@@ -8,14 +8,19 @@ import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 from _common import output, error
+from config import WIKI_DUMP_PATH
 
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--wiki-dump", default="maplestorywikinet.xml",
+    parser.add_argument("--wiki-dump", default=WIKI_DUMP_PATH,
                         help="Path to MediaWiki XML dump")
     parser.add_argument("--clear-existing", action="store_true",
                         help="Clear the existing index before re-indexing")
+    parser.add_argument("--batch-size", type=int, default=1024,
+                        help="Chunks embedded and inserted per batch")
+    parser.add_argument("--use-ip", action="store_true",
+                        help="Use inner-product distance when (re)creating the collection")
     args = parser.parse_args()
 
     if not os.path.exists(args.wiki_dump):
@@ -26,18 +31,22 @@ def main():
     except ImportError as e:
         error(f"Cannot import RAGSystem: {e}")
 
-    rag = RAGSystem()
+    rag = RAGSystem(use_ip=True if args.use_ip else None)
 
     if args.clear_existing:
         rag.clear_collection()
 
-    rag.index_wiki_dump(args.wiki_dump)
+    rag.index_wiki_dump(args.wiki_dump, batch_size=args.batch_size)
     stats = rag.get_stats()
 
     output({
         "indexed": True,
         "wiki_dump": args.wiki_dump,
         "cleared_existing": args.clear_existing,
+        "batch_size": args.batch_size,
+        # What the collection was actually built with: without
+        # --clear-existing, --use-ip can't change an existing collection
+        "hnsw_space": rag.collection_space() or rag.hnsw_space,
         "total_chunks": stats.get("total_chunks", 0),
         "collection_name": stats.get("collection_name", ""),
     })
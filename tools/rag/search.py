@@ -15,6 +15,8 @@ def main():
     parser.add_argument("query", help="Search query")
     parser.add_argument("--n-results", type=int, default=3,
                         help="Number of results to return (default: 3)")
+    parser.add_argument("--max-chars", type=int, default=None,
+                        help="Truncate each result's content to this many characters")
     args = parser.parse_args()
 
     try:
@@ -23,7 +25,7 @@ def main():
         error(f"Cannot import RAGSystem: {e}")
 
     rag = RAGSystem()
-    results = rag.search(args.query, n_results=args.n_results)
+    results = rag.search(args.query, n_results=args.n_results, max_content_chars=args.max_chars)
 
     output({
         "query": args.query,
@@ -25,6 +25,15 @@ MODEL_PRICING = {
 WEB_SEARCH_COST = 0.01  # per search
 
 USAGE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "claude_usage.json")
+# Append-only per-request deltas since the last snapshot. Replayed and folded
+# into USAGE_FILE on startup and every USAGE_COMPACT_EVERY records, so a
+# request costs one appended line instead of rewriting the whole history.
+USAGE_LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "claude_usage.jsonl")
+USAGE_COMPACT_EVERY = 1000
+# Snapshot key holding the last log sequence number it includes; log lines at
+# or below it are skipped on replay, so a log that outlives its compaction
+# (failed delete, crash) is never counted twice
+_LOG_SEQ_KEY = "_log_seq"
 
 
 class UsageTracker:
@@ -32,29 +41,93 @@ class UsageTracker:
 
     def __init__(self, monthly_budget: float = 100.0):
         self.monthly_budget = monthly_budget
+        self._log = None
+        self._seq = 0  # sequence number of the last recorded delta
+        self._since_compact = 0
         self._data = self._load()
+        self._compact()
 
     def _current_month_key(self) -> str:
         return datetime.now(timezone.utc).strftime("%Y-%m")
 
     def _load(self) -> dict:
+        data = {}
         if os.path.exists(USAGE_FILE):
             try:
                 with open(USAGE_FILE, "r") as f:
-                    return json.load(f)
+                    data = json.load(f)
             except (json.JSONDecodeError, OSError):
                 logger.warning("Corrupt usage file, resetting")
-        return {}
+                data = {}
+        snapshot_seq = data.pop(_LOG_SEQ_KEY, 0)
+        self._seq = snapshot_seq
+        self._data = data
+        if os.path.exists(USAGE_LOG_FILE):
+            try:
+                with open(USAGE_LOG_FILE, "r") as f:
+                    for line in f:
+                        try:
+                            delta = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue  # torn final line from a crash
+                        seq = delta.get("seq")
+                        if seq is not None:
+                            if seq <= snapshot_seq:
+                                continue  # already in the snapshot
+                            self._seq = max(self._seq, seq)
+                        self._apply(delta)
+            except OSError as e:
+                logger.warning(f"Failed to replay usage log: {e}")
+        return self._data
+
+    def _compact(self):
+        """Fold the log into the snapshot and truncate the log."""
+        self._since_compact = 0
+        if not os.path.exists(USAGE_LOG_FILE):
+            return
+        self._close_log()
+        tmp_path = USAGE_FILE + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({**self._data, _LOG_SEQ_KEY: self._seq}, f, indent=2)
+            os.replace(tmp_path, USAGE_FILE)
+            os.remove(USAGE_LOG_FILE)
+        except OSError as e:
+            logger.error(f"Failed to compact usage data: {e}")
+
+    def _close_log(self):
+        if self._log is not None:
+            try:
+                self._log.close()
+            except OSError as e:
+                logger.error(f"Failed to close usage log: {e}")
+            self._log = None
+
+    def close(self):
+        """Fold outstanding usage into the snapshot and close the log."""
+        self._compact()
+        self._close_log()
+
+    def _apply(self, delta: dict):
+        """Add one request's usage to its month's totals."""
+        month = self._get_month(delta["month"])
+        month["input_tokens"] += delta["input_tokens"]
+        month["output_tokens"] += delta["output_tokens"]
+        month["web_searches"] += delta["web_searches"]
+        month["requests"] += 1
+        month["estimated_cost"] = round(month["estimated_cost"] + delta["cost"], 6)
+        return month
 
-    def _save(self):
+    def _append_log(self, delta: dict):
         try:
-            with open(USAGE_FILE, "w") as f:
-                json.dump(self._data, f, indent=2)
+            if self._log is None:
+                self._log = open(USAGE_LOG_FILE, "a", buffering=1)  # line-buffered
+            self._log.write(json.dumps(delta) + "\n")
         except OSError as e:
             logger.error(f"Failed to save usage data: {e}")
 
-    def _get_month(self) -> dict:
-        key = self._current_month_key()
+    def _get_month(self, key: str = None) -> dict:
+        key = key or self._current_month_key()
         if key not in self._data:
             self._data[key] = {
                 "input_tokens": 0,
@@ -67,19 +140,25 @@ class UsageTracker:
 
     def record_usage(self, model: str, input_tokens: int, output_tokens: int, web_searches: int = 0):
         """Record token usage from an API response and update estimated cost."""
-        month = self._get_month()
-        month["input_tokens"] += input_tokens
-        month["output_tokens"] += output_tokens
-        month["web_searches"] += web_searches
-        month["requests"] += 1
-
         # Calculate cost for this request
         input_price, output_price = MODEL_PRICING.get(model, (3.0, 15.0))
         cost = (input_tokens / 1_000_000 * input_price) + (output_tokens / 1_000_000 * output_price)
         cost += web_searches * WEB_SEARCH_COST
-        month["estimated_cost"] = round(month["estimated_cost"] + cost, 6)
 
-        self._save()
+        self._seq += 1
+        delta = {
+            "seq": self._seq,
+            "month": self._current_month_key(),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "web_searches": web_searches,
+            "cost": cost,
+        }
+        month = self._apply(delta)
+        self._append_log(delta)
+        self._since_compact += 1
+        if self._since_compact >= USAGE_COMPACT_EVERY:
+            self._compact()
         logger.info(f"Usage recorded: +{input_tokens}in/{output_tokens}out, ${cost:.4f} this request, ${month['estimated_cost']:.2f} this month")
 
     @property
@@ -1,13 +1,37 @@
 """Utility functions for Discord LLM Bot"""
 
+import asyncio
 import base64
 import datetime
+import hashlib
 import io
+import os
+import threading
 import time
+from collections import OrderedDict
 from typing import List
 
 from sandbox import safe_path
 
+# Try to import optional dependencies: pybase64 uses SIMD encoders and is a
+# drop-in for multi-MB image payloads; stdlib base64 otherwise.
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
+# Attachment extensions treated as images (vision input / img2img source)
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp"})
+
+# Base64 of recently encoded images, keyed by SHA-1 of the file bytes, so the
+# same picture (re-uploaded, or re-read from a reply) is encoded once and every
+# context entry holding it shares one string. _STAT_KEYS maps
+# (path, mtime_ns, size) to the digest and skips the read for unchanged files.
+_B64_CACHE_SIZE = 32
+_b64_cache: "OrderedDict[bytes, str]" = OrderedDict()
+_stat_keys: "OrderedDict[tuple, bytes]" = OrderedDict()
+_b64_lock = threading.Lock()  # encodes run on worker threads
+
 
 def timestamp() -> str:
     """Generate a timestamp string for file naming"""
@@ -18,12 +42,37 @@ def encode_file_to_base64(path: str) -> str:
     """Encode a file to base64 string"""
     path = safe_path(path)
     with open(path, "rb") as file:
-        return base64.b64encode(file.read()).decode("utf-8")
+        return _b64.b64encode(file.read()).decode("utf-8")
 
 
 def encode_image_to_base64(image_path: str) -> str:
-    """Encode an image file to base64 string"""
-    return encode_file_to_base64(image_path)
+    """Encode an image file to base64 string (cached by content)"""
+    image_path = safe_path(image_path)
+    st = os.stat(image_path)
+    stat_key = (image_path, st.st_mtime_ns, st.st_size)
+    with _b64_lock:
+        digest = _stat_keys.get(stat_key)
+        if digest is not None and digest in _b64_cache:
+            _b64_cache.move_to_end(digest)
+            return _b64_cache[digest]
+
+    with open(image_path, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha1(data).digest()
+    with _b64_lock:
+        encoded = _b64_cache.get(digest)
+    if encoded is None:
+        encoded = _b64.b64encode(data).decode("utf-8")
+
+    with _b64_lock:
+        _b64_cache[digest] = encoded
+        _b64_cache.move_to_end(digest)
+        _stat_keys[stat_key] = digest
+        while len(_b64_cache) > _B64_CACHE_SIZE:
+            _b64_cache.popitem(last=False)
+        while len(_stat_keys) > _B64_CACHE_SIZE * 2:
+            _stat_keys.popitem(last=False)
+    return encoded
 
 
 def encode_images_to_base64(image_paths: List[str]) -> List[str]:
@@ -31,6 +80,17 @@ def encode_images_to_base64(image_paths: List[str]) -> List[str]:
     return [encode_image_to_base64(path) for path in image_paths]
 
 
+async def encode_images_to_base64_async(image_paths: List[str]) -> List[str]:
+    """Encode multiple image files concurrently, each on a worker thread.
+
+    Reads and base64 encoding release the GIL, so a multi-image upload
+    finishes in roughly the time of its largest file. Order is preserved.
+    """
+    return list(await asyncio.gather(
+        *(asyncio.to_thread(encode_image_to_base64, path) for path in image_paths)
+    ))
+
+
 def encode_image_downsized_to_base64(image_path: str, max_side: int = 512) -> str:
     """Encode an image downsized to fit within max_side on the longest edge.
 
@@ -53,4 +113,4 @@ def encode_image_downsized_to_base64(image_path: str, max_side: int = 512) -> st
             img = img.resize((new_w, new_h), Image.LANCZOS)
         buf = io.BytesIO()
         img.save(buf, format="PNG")
-        return base64.b64encode(buf.getvalue()).decode("utf-8")
\ No newline at end of file
+        return _b64.b64encode(buf.getvalue()).decode("utf-8")
\ No newline at end of file
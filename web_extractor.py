@@ -4,6 +4,8 @@ import asyncio
 import base64
 import re
 import logging
+import time
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 
 import aiohttp
@@ -22,6 +24,12 @@ MAX_CONTENT_LENGTH_WIKI = 6000
 # Below this threshold, we retry with JS rendering if available.
 _MIN_CONTENT_THRESHOLD = 100
 
+# Recently fetched pages (url -> (fetched_at, title, content)), so a link that
+# is pasted again or re-quoted in a reply skips the HTTP/JS/vision pipeline.
+_PAGE_CACHE_SIZE = 128
+_PAGE_CACHE_TTL = 600  # seconds
+_page_cache: "OrderedDict[str, Tuple[float, str, str]]" = OrderedDict()
+
 _VISION_EXTRACT_PROMPT = (
     "Extract ALL text content, data, and tables from this webpage screenshot. "
     "For tables, preserve the structure using plain text columns. "
@@ -225,6 +233,26 @@ async def fetch_webpage_content(url: str, timeout: int = 10, max_length: int = N
         return "", f"Error fetching webpage: {str(e)}"
 
 
+async def _fetch_webpage_content_cached(url: str) -> Tuple[str, str]:
+    """fetch_webpage_content with a small TTL'd LRU in front of it.
+
+    Only successful extractions are cached; errors are retried next time.
+    """
+    cached = _page_cache.get(url)
+    if cached is not None and time.monotonic() - cached[0] < _PAGE_CACHE_TTL:
+        _page_cache.move_to_end(url)
+        logger.debug(f"Page cache hit for {url}")
+        return cached[1], cached[2]
+
+    title, content = await fetch_webpage_content(url)
+    if content and not content.startswith("Error fetching webpage"):
+        _page_cache[url] = (time.monotonic(), title, content)
+        _page_cache.move_to_end(url)
+        if len(_page_cache) > _PAGE_CACHE_SIZE:
+            _page_cache.popitem(last=False)
+    return title, content
+
+
 async def extract_webpage_context(text: str) -> Tuple[str, List[Dict[str, str]]]:
     """
     Extract content from URLs in text and return formatted context.
@@ -241,7 +269,7 @@ async def extract_webpage_context(text: str) -> Tuple[str, List[Dict[str, str]]]
     fetched_sources = []
 
     for url in urls:
-        title, content = await fetch_webpage_content(url)
+        title, content = await _fetch_webpage_content_cached(url)
         if content:
             context_parts.append(f"Web Page Content (from {url}):\nTitle: {title}\nContent: {content}\n")
             fetched_sources.append({"url": url, "title": title or url})